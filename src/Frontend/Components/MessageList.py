@@ -0,0 +1,184 @@
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import flet as ft
+
+
+class MessageList:
+    """
+    Lista de mensajes del chat sobre un ft.ListView virtualizado.
+    Cada mensaje nuevo agrega un solo control y actualiza solo la lista (o solo ese
+    control mientras llega por streaming); los anchos se recalculan únicamente
+    después de que el usuario deja de redimensionar la ventana.
+    Si se pasa `cargar_anteriores`, al llegar al tope del scroll se pide la página
+    anterior de mensajes y se inserta al principio.
+    """
+
+    def __init__(self, page: ft.Page, debounce_resize: float = 0.25,
+                 cargar_anteriores: Optional[Callable[[], Awaitable[List[Tuple[str, str]]]]] = None):
+        self.page = page
+        self.debounce_resize = debounce_resize
+        self.cargar_anteriores = cargar_anteriores
+        self._resize_gen = 0
+        self._cargando = False
+        self._hay_anteriores = cargar_anteriores is not None
+        # [contenido, role, Row] de cada mensaje mostrado, en orden.
+        self._mensajes: List[list] = []
+
+        self.welcome = ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text(
+                        "Hola",
+                        size=60,
+                        weight=ft.FontWeight.BOLD,
+                        color=ft.Colors.BLUE_ACCENT_400,
+                    ),
+                    ft.Text(
+                        "¿Cómo puedo ayudarte?", size=20, color=ft.Colors.WHITE
+                    ),
+                ],
+                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                alignment=ft.MainAxisAlignment.CENTER,
+            ),
+            expand=True,
+            alignment=ft.alignment.center,
+        )
+
+        self.view = ft.ListView(
+            controls=[self.welcome],
+            expand=True,
+            auto_scroll=True,
+            on_scroll=self._on_scroll,
+            on_scroll_interval=100,
+        )
+
+    def calcular_ancho(self, msg_content: str) -> float:
+        screen_width = self.page.window_width
+        horizontal_padding_total = 40
+
+        if screen_width < 600:
+            content_width = screen_width * 0.9 - horizontal_padding_total
+            content_width = max(content_width, 100)
+        else:
+            content_width = min(600, max(100, len(msg_content) * 9))
+            content_width = max(content_width, 100)
+        return content_width
+
+    def _crear_control(self, msg_content: str, msg_role: str) -> ft.Row:
+        is_user = msg_role == "user"
+        content_width = self.calcular_ancho(msg_content)
+
+        if is_user:
+            message_control = ft.Container(
+                content=ft.Text(
+                    msg_content,
+                    color=ft.Colors.WHITE,
+                    size=18,
+                    selectable=True,
+                    width=content_width,
+                    max_lines=None,
+                ),
+                padding=ft.padding.symmetric(vertical=10, horizontal=18),
+                bgcolor="#1e2128",
+                border_radius=18,
+                width=content_width + 36,
+                margin=ft.margin.only(top=4, bottom=4),
+                expand=False,
+            )
+        else:
+            message_control = ft.Container(
+                content=ft.Text(
+                    msg_content,
+                    color=ft.Colors.WHITE,
+                    size=18,
+                    selectable=True,
+                    text_align=ft.TextAlign.START,
+                    width=content_width,
+                    max_lines=None,
+                ),
+                padding=ft.padding.symmetric(vertical=5, horizontal=0),
+                margin=ft.margin.only(top=4, bottom=4, left=20, right=20),
+                width=content_width,
+                expand=False,
+            )
+
+        return ft.Row(
+            [message_control],
+            alignment=(
+                ft.MainAxisAlignment.END
+                if is_user
+                else ft.MainAxisAlignment.START
+            ),
+            expand=True,
+        )
+
+    def _aplicar_ancho(self, mensaje: list):
+        msg_content, msg_role, row = mensaje
+        container = row.controls[0]
+        content_width = self.calcular_ancho(msg_content)
+        container.content.width = content_width
+        container.width = content_width + 36 if msg_role == "user" else content_width
+
+    def agregar(self, msg_content: str, msg_role: str) -> list:
+        """Agrega un mensaje al final y lo devuelve para poder actualizarlo luego."""
+        if not self._mensajes:
+            self.view.controls.clear()
+        mensaje = [msg_content, msg_role, self._crear_control(msg_content, msg_role)]
+        self._mensajes.append(mensaje)
+        self.view.controls.append(mensaje[2])
+        self.view.update()
+        return mensaje
+
+    def agregar_al_inicio(self, mensajes: List[Tuple[str, str]]):
+        """Inserta una página de mensajes (contenido, role) antiguos arriba de los actuales."""
+        if not mensajes:
+            return
+        primera_pagina = not self._mensajes
+        if primera_pagina:
+            self.view.controls.clear()
+        nuevos = [[c, r, self._crear_control(c, r)] for c, r in mensajes]
+        self._mensajes[:0] = nuevos
+        self.view.controls[:0] = [row for _, _, row in nuevos]
+        # Salvo en la primera página, sin auto_scroll para que insertar arriba no
+        # salte al final de la lista.
+        self.view.auto_scroll = primera_pagina
+        self.view.update()
+        self.view.auto_scroll = True
+
+    async def cargar_mas(self):
+        """Pide la página anterior de mensajes y la inserta arriba, una carga a la vez."""
+        if not self._hay_anteriores or self._cargando:
+            return
+        self._cargando = True
+        try:
+            mensajes = await self.cargar_anteriores()
+            if mensajes:
+                self.agregar_al_inicio(mensajes)
+            else:
+                self._hay_anteriores = False
+        finally:
+            self._cargando = False
+
+    async def _on_scroll(self, e: ft.OnScrollEvent):
+        if e.pixels <= e.min_scroll_extent + 50:
+            await self.cargar_mas()
+
+    def actualizar(self, mensaje: list, msg_content: str):
+        """Reemplaza el texto de un mensaje (p. ej. mientras llega por streaming)."""
+        mensaje[0] = msg_content
+        row = mensaje[2]
+        row.controls[0].content.value = msg_content
+        self._aplicar_ancho(mensaje)
+        row.update()
+
+    async def on_resize(self, e=None):
+        # Solo el último evento de una ráfaga de redimensionado recalcula los anchos.
+        self._resize_gen += 1
+        gen = self._resize_gen
+        await asyncio.sleep(self.debounce_resize)
+        if gen != self._resize_gen:
+            return
+        for mensaje in self._mensajes:
+            self._aplicar_ancho(mensaje)
+        self.view.update()
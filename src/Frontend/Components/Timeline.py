@@ -0,0 +1,54 @@
+import asyncio
+from typing import Dict, List, Tuple
+
+import flet as ft
+
+
+class Timeline:
+    """
+    Animación de entrada escalonada sin bloquear el hilo del evento: cada paso cambia
+    propiedades de uno o más controles en un instante dado, y corre como tarea del
+    bucle de Flet (page.run_task) con asyncio.sleep entre pasos. Los pasos que caen
+    en el mismo instante se envían juntos en un solo update de esos controles.
+    """
+
+    def __init__(self, page: ft.Page):
+        self.page = page
+        # instante (segundos desde el inicio) -> [(control, propiedades)]
+        self._pasos: Dict[float, List[Tuple[ft.Control, dict]]] = {}
+        self._ultimo = 0.0
+        self._cancelada = False
+
+    def en(self, segundos: float, *controles: ft.Control, **propiedades) -> "Timeline":
+        """Programa el cambio de `propiedades` en los controles a los `segundos` del inicio."""
+        instante = round(segundos, 3)
+        self._pasos.setdefault(instante, []).extend((c, propiedades) for c in controles)
+        self._ultimo = max(self._ultimo, instante)
+        return self
+
+    def luego(self, segundos: float, *controles: ft.Control, **propiedades) -> "Timeline":
+        """Como `en`, pero `segundos` después del último paso programado."""
+        return self.en(self._ultimo + segundos, *controles, **propiedades)
+
+    def iniciar(self):
+        self.page.run_task(self._correr)
+
+    def cancelar(self):
+        """Detiene los pasos pendientes (p. ej. al navegar a otra vista)."""
+        self._cancelada = True
+
+    async def _correr(self):
+        transcurrido = 0.0
+        for instante in sorted(self._pasos):
+            if instante > transcurrido:
+                await asyncio.sleep(instante - transcurrido)
+                transcurrido = instante
+            if self._cancelada:
+                return
+            cambiados = []
+            for control, propiedades in self._pasos[instante]:
+                for nombre, valor in propiedades.items():
+                    setattr(control, nombre, valor)
+                if control not in cambiados:
+                    cambiados.append(control)
+            self.page.update(*cambiados)
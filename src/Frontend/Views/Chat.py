@@ -1,131 +1,59 @@
 import flet as ft
 from backend.models.gemini import Gemini
+from Frontend.Components.MessageList import MessageList
 
 
-def Chat(page: ft.Page):
+# Mensajes por página al reabrir un chat existente.
+PAGINA_HISTORIAL = 50
+
+
+def Chat(page: ft.Page, chat_id=None):
     page.title = "Chat Interface"
     gemini_client = Gemini()
     current_user_id = 1
 
-    messages = []
-    current_chat_id = None
-
-    def update_chat(e=None):
-        chat_column.controls.clear()
-        screen_width = page.window_width
-
-        if not messages:
-            chat_column.controls.append(
-                ft.Container(
-                    content=ft.Column(
-                        [
-                            ft.Text(
-                                "Hola",
-                                size=60,
-                                weight=ft.FontWeight.BOLD,
-                                color=ft.Colors.BLUE_ACCENT_400,
-                            ),
-                            ft.Text(
-                                "¿Cómo puedo ayudarte?", size=20, color=ft.Colors.WHITE
-                            ),
-                        ],
-                        horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                        alignment=ft.MainAxisAlignment.CENTER,
-                    ),
-                    expand=True,
-                    alignment=ft.alignment.center,
-                )
-            )
-        else:
-            for msg_content, msg_role in messages:
-                is_user = msg_role == "user"
-
-                horizontal_padding_total = 40
-
-                if screen_width < 600:
-                    content_width = screen_width * 0.9 - horizontal_padding_total
-                    content_width = max(content_width, 100)
-                else:
-                    content_width = min(600, max(100, len(msg_content) * 9))
-                    content_width = max(content_width, 100)
-
-                if is_user:
-                    message_control = ft.Container(
-                        content=ft.Text(
-                            msg_content,
-                            color=ft.Colors.WHITE,
-                            size=18,
-                            selectable=True,
-                            width=content_width,
-                            max_lines=None,
-                        ),
-                        padding=ft.padding.symmetric(vertical=10, horizontal=18),
-                        bgcolor="#1e2128",
-                        border_radius=18,
-                        width=content_width + 36,
-                        margin=ft.margin.only(top=4, bottom=4),
-                        expand=False,
-                    )
-                else:
-                    message_control = ft.Container(
-                        content=ft.Text(
-                            msg_content,
-                            color=ft.Colors.WHITE,
-                            size=18,
-                            selectable=True,
-                            text_align=ft.TextAlign.START,
-                            width=content_width,
-                            max_lines=None,
-                        ),
-                        padding=ft.padding.symmetric(vertical=5, horizontal=0),
-                        margin=ft.margin.only(top=4, bottom=4, left=20, right=20),
-                        width=content_width,
-                        expand=False,
-                    )
-
-                chat_column.controls.append(
-                    ft.Row(
-                        [message_control],
-                        alignment=(
-                            ft.MainAxisAlignment.END
-                            if is_user
-                            else ft.MainAxisAlignment.START
-                        ),
-                        expand=True,
-                    )
-                )
-
-        chat_column.auto_scroll = True
-        page.update()
-
-    page.on_resize = update_chat
-
-    chat_column = ft.Column(
-        expand=True,
-        scroll=ft.ScrollMode.AUTO,
-        horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+    current_chat_id = chat_id
+    # `orden` del mensaje más antiguo cargado; las páginas anteriores se piden desde ahí.
+    oldest_orden = None
+
+    async def load_older_messages():
+        nonlocal oldest_orden
+        if current_chat_id is None or oldest_orden == 1:
+            return []
+        page_messages = await gemini_client.obtener_historial_chat_async(
+            current_chat_id, antes_de_orden=oldest_orden, limite=PAGINA_HISTORIAL
+        )
+        if page_messages:
+            oldest_orden = page_messages[0]["orden"]
+        return [(msg["content"], msg["role"]) for msg in page_messages]
+
+    message_list = MessageList(
+        page, cargar_anteriores=load_older_messages if chat_id is not None else None
     )
+    page.on_resize = message_list.on_resize
 
-    def send_message(e):
+    async def send_message(e):
         nonlocal current_chat_id
         user_msg = input_field.value.strip()
         if user_msg:
-            messages.append((user_msg, "user"))
             input_field.value = ""
-            update_chat()
+            input_field.update()
+            message_list.agregar(user_msg, "user")
 
+            # La respuesta se muestra en un único control que crece con cada
+            # fragmento, en vez de esperar al texto completo.
+            response_message = message_list.agregar("", "model")
+            response_text = ""
             try:
-                response_text = gemini_client.generar_respuesta(
+                respuesta = await gemini_client.generar_respuesta_stream_async(
                     prompt=user_msg, chat_id=current_chat_id, user_id=current_user_id
                 )
-                if current_chat_id is None:
-                    current_chat_id = gemini_client.current_chat_id
-
-                messages.append((response_text, "model"))
+                current_chat_id = respuesta.chat_id
+                async for chunk in respuesta:
+                    response_text += chunk
+                    message_list.actualizar(response_message, response_text)
             except Exception as ex:
-                messages.append((f"Error al obtener respuesta: {ex}", "model"))
-            finally:
-                update_chat()
+                message_list.actualizar(response_message, f"Error al obtener respuesta: {ex}")
 
     input_field = ft.TextField(
         hint_text="Pregúntale a...",
@@ -189,7 +117,7 @@ def Chat(page: ft.Page):
                     padding=ft.padding.only(right=15, top=10),
                 ),
                 ft.Container(
-                    content=chat_column, alignment=ft.alignment.center, expand=True
+                    content=message_list.view, alignment=ft.alignment.center, expand=True
                 ),
                 ft.Row(
                     [
@@ -209,7 +137,10 @@ def Chat(page: ft.Page):
 
     page.add(ft.Container(content=chat_area, expand=True))
 
-    update_chat()
+    if chat_id is not None:
+        # Al reabrir un chat se muestra primero la página más reciente; las
+        # anteriores se cargan al hacer scroll hacia arriba.
+        page.run_task(message_list.cargar_mas)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,16 @@
+import asyncio
+import importlib
+
 import flet as ft
-from Frontend.Views.Chat import Chat
+from Frontend.Components.Timeline import Timeline
+
+
+async def _precalentar():
+    # El backend de Gemini (y el SDK) se importa en un hilo para no trabar la
+    # animación; luego se abre la conexión con la API.
+    gemini = await asyncio.to_thread(importlib.import_module, "backend.models.gemini")
+    await gemini.precalentar_async()
+
 
 def Home(page: ft.Page):
     page.title = "ANGLAI - Guía Rápida"
@@ -36,7 +47,7 @@ def Home(page: ft.Page):
 
     instruction_point_1 = ft.Row(
         [
-            ft.Icon(ft.Icons.CHAT_BUBBLE_OUTLINE, color=ft.Colors.WHITE, size=30),
+            ft.Icon(ft.Icons.CHAT_BUBBLE_OUTLINE, color=ft.Colors.WHITE, size=30, opacity=0),
             ft.Text(
                 "Pregúntame sobre tu tesis: ¡Soy experto en lineamientos de trabajos de grado! Puedes consultarme sobre:",
                 size=18,
@@ -44,6 +55,7 @@ def Home(page: ft.Page):
                 weight=ft.FontWeight.BOLD,
                 text_align=ft.TextAlign.LEFT,
                 expand=True,  
+                opacity=0,
             ),
         ],
         vertical_alignment=ft.CrossAxisAlignment.START,
@@ -53,26 +65,30 @@ def Home(page: ft.Page):
         "    •  Título y planteamiento del problema",
         size=16,
         color=ft.Colors.BLUE_GREY_100,
+        opacity=0,
     )
     instruction_sub_point_1_2 = ft.Text(
         "    •  Objetivos y justificación",
         size=16,
         color=ft.Colors.BLUE_GREY_100,
+        opacity=0,
     )
     instruction_sub_point_1_3 = ft.Text(
         "    •  Marco teórico y metodológico",
         size=16,
         color=ft.Colors.BLUE_GREY_100,
+        opacity=0,
     )
     instruction_sub_point_1_4 = ft.Text(
         "¡Y cualquier otra duda que tengas!",
         size=16,
         color=ft.Colors.BLUE_GREY_100,
+        opacity=0,
     )
 
     instruction_point_2 = ft.Row(
         [
-            ft.Icon(ft.Icons.MAP, color=ft.Colors.WHITE, size=30),
+            ft.Icon(ft.Icons.MAP, color=ft.Colors.WHITE, size=30, opacity=0),
             ft.Text(
                 "Crea mapas mentales: ¿Necesitas visualizar tus ideas? ¡Juntos podemos construir mapas mentales para organizar y entender mejor tus temas!",
                 size=18,
@@ -80,6 +96,7 @@ def Home(page: ft.Page):
                 weight=ft.FontWeight.BOLD,
                 text_align=ft.TextAlign.LEFT,
                 expand=True,  
+                opacity=0,
             ),
         ],
         vertical_alignment=ft.CrossAxisAlignment.START,
@@ -97,6 +114,9 @@ def Home(page: ft.Page):
     )
 
     def on_start_chat_click(e):
+        from Frontend.Views.Chat import Chat
+
+        intro.cancelar()
         page.clean()
         Chat(page)
         page.update()
@@ -163,60 +183,26 @@ def Home(page: ft.Page):
     )
     page.update()
 
-    welcome_title.opacity = 1
-    page.update()
-    import time
-
-    time.sleep(0.1)
-
-    intro_text.opacity = 1
-    page.update()
-    time.sleep(0.1)
-
-
-    instruction_point_1.controls[0].opacity = 0 
-    instruction_point_1.controls[1].opacity = 0
-    page.update()
-    time.sleep(0.1)
-    instruction_point_1.controls[0].opacity = 1
-    instruction_point_1.controls[1].opacity = 1
-    page.update()
-    time.sleep(0.1)
-
-    instruction_sub_point_1_1.opacity = 0
-    instruction_sub_point_1_2.opacity = 0
-    instruction_sub_point_1_3.opacity = 0
-    instruction_sub_point_1_4.opacity = 0
-    page.update()
-    time.sleep(0.1)
-    instruction_sub_point_1_1.opacity = 1
-    page.update()
-    time.sleep(0.05)
-    instruction_sub_point_1_2.opacity = 1
-    page.update()
-    time.sleep(0.05)
-    instruction_sub_point_1_3.opacity = 1
-    page.update()
-    time.sleep(0.05)
-    instruction_sub_point_1_4.opacity = 1
-    page.update()
-    time.sleep(0.1)
-
-    instruction_point_2.controls[0].opacity = 0
-    instruction_point_2.controls[1].opacity = 0
-    page.update()
-    time.sleep(0.1)
-    instruction_point_2.controls[0].opacity = 1
-    instruction_point_2.controls[1].opacity = 1
-    page.update()
-    time.sleep(0.1)
-
-    final_prompt.opacity = 1
-    page.update()
-    time.sleep(0.1)
+    # Mientras el usuario lee la guía se abre la conexión con Gemini, así el primer
+    # mensaje del chat no paga el handshake.
+    page.run_task(_precalentar)
+
+    # Aparición escalonada de la guía; los pasos del mismo instante van en un solo update.
+    intro = (
+        Timeline(page)
+        .en(0, welcome_title, opacity=1)
+        .luego(0.1, intro_text, opacity=1)
+        .luego(0.2, *instruction_point_1.controls, opacity=1)
+        .luego(0.2, instruction_sub_point_1_1, opacity=1)
+        .luego(0.05, instruction_sub_point_1_2, opacity=1)
+        .luego(0.05, instruction_sub_point_1_3, opacity=1)
+        .luego(0.05, instruction_sub_point_1_4, opacity=1)
+        .luego(0.2, *instruction_point_2.controls, opacity=1)
+        .luego(0.1, final_prompt, opacity=1)
+        .luego(0.1, start_button, opacity=1)
+    )
 
-    start_button.opacity = 1
-    page.update()
+    intro.iniciar()
 
 if __name__ == "__main__":
     ft.app(target=Home)
\ No newline at end of file
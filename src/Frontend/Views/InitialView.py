@@ -1,6 +1,5 @@
 import flet as ft
-from Frontend.Views.Register import Register
-from Frontend.Views.Login import Login
+from Frontend.Components.Timeline import Timeline
 
 
 def InitialView(page: ft.Page):
@@ -53,12 +52,19 @@ def InitialView(page: ft.Page):
         animate_offset=text_animation,
     )
 
+    # Las vistas siguientes se importan al navegar, no al arrancar la aplicación.
     def navigate_to_login(e):
+        from Frontend.Views.Login import Login
+
+        intro.cancelar()
         page.clean()
         Login(page)
         page.update()
 
     def navigate_to_signup(e):
+        from Frontend.Views.Register import Register
+
+        intro.cancelar()
         page.clean()
         Register(page)
         page.update()
@@ -106,27 +112,13 @@ def InitialView(page: ft.Page):
     page.add(main_content)
     page.update()
 
-    anglai_logo.opacity = 1
-    page.update()
-    import time
-
-    time.sleep(0.3)
-
-    title.opacity = 1
-    page.update()
-    time.sleep(0.2)
-
-    subtitle.opacity = 1
-    page.update()
-    time.sleep(0.2)
-
-    description.opacity = 1
-    page.update()
-    time.sleep(0.3)
-
-    login_button.opacity = 1
-    page.update()
-    time.sleep(0.1)
-
-    join_button.opacity = 1
-    page.update()
+    intro = (
+        Timeline(page)
+        .en(0, anglai_logo, opacity=1)
+        .en(0.3, title, opacity=1)
+        .en(0.5, subtitle, opacity=1)
+        .en(0.7, description, opacity=1)
+        .en(1.0, login_button, opacity=1)
+        .en(1.1, join_button, opacity=1)
+    )
+    intro.iniciar()
@@ -1,6 +1,6 @@
+import asyncio
 import flet as ft
 from backend.models.user import User 
-from Frontend.Views.Home import Home
 
 
 def Login(page: ft.Page):
@@ -54,14 +54,18 @@ def Login(page: ft.Page):
         visible=False 
     )
 
-    def on_login_click(e):
+    async def on_login_click(e):
         username = username_field.value
         password = password_field.value
         print(f"Usuario: {username}, Contraseña: {password}")
 
         user = User()
-        if user.login(username, password):
+        # La consulta corre en un hilo para no bloquear el bucle de eventos.
+        if await asyncio.to_thread(user.login, username, password):
             print("Inicio de sesión exitoso")
+            # Home trae consigo el chat y el SDK de Gemini: se importa recién aquí.
+            from Frontend.Views.Home import Home
+
             page.clean()
             Home(page)
             page.update()
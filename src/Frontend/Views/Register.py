@@ -1,3 +1,4 @@
+import asyncio
 import flet as ft
 from backend.models.user import User
 from Frontend.Views.Login import Login
@@ -61,9 +62,12 @@ def Register(page: ft.Page):
         value="", color=ft.Colors.RED_ACCENT_400, size=14, visible=False
     )
 
-    def handle_register(e):
+    async def handle_register(e):
         user = User()
-        if user.register(username_field.value, email_field.value, password_field.value):
+        # La inserción corre en un hilo para no bloquear el bucle de eventos.
+        if await asyncio.to_thread(
+            user.register, username_field.value, email_field.value, password_field.value
+        ):
             print("Registro exitoso")
             page.clean()
             Login(page)
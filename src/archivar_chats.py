@@ -0,0 +1,65 @@
+"""
+Archivado de chats fríos.
+
+Mueve los chats sin mensajes nuevos en los últimos N días a segmentos JSONL
+comprimidos (un directorio por usuario), registra su ubicación en ChatArchivado y
+compacta la base con PRAGMA incremental_vacuum. Un chat archivado se rehidrata solo
+la próxima vez que se abre desde la aplicación.
+
+Las bases nuevas se crean en auto_vacuum incremental. Una base creada antes necesita
+convertirse una vez con --convertir-auto-vacuum, que hace un VACUUM completo: correrlo
+con la aplicación cerrada y con espacio libre en disco para una copia de la base.
+Mientras tanto el archivado funciona, pero el archivo de la base no se achica.
+
+Uso:
+    python archivar_chats.py --dias 180
+    python archivar_chats.py --convertir-auto-vacuum
+"""
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from database.archivo import archivar_inactivos, convertir_auto_vacuum, directorio_archivo
+from database.storage import init_storage
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Archiva los chats inactivos en JSONL comprimido.")
+    parser.add_argument("--dias", type=int, default=180, help="Días sin actividad para archivar un chat")
+    parser.add_argument("--directorio", default=None,
+                        help="Directorio de los segmentos (por omisión TESISIA_ARCHIVO o ./archivo)")
+    parser.add_argument("--limite", type=int, default=None, help="Máximo de chats a archivar en esta corrida")
+    parser.add_argument("--convertir-auto-vacuum", action="store_true",
+                        help="Mantenimiento único: pasa la base a auto_vacuum incremental (VACUUM completo) "
+                             "en lugar de archivar")
+    args = parser.parse_args(argv)
+
+    # Mismas variables TESISIA_* que la aplicación, p. ej. TESISIA_ARCHIVO.
+    load_dotenv()
+    directorio = args.directorio or directorio_archivo()
+    pool = init_storage()
+    antes = os.path.getsize(pool.db_path)
+    if args.convertir_auto_vacuum:
+        convertida = convertir_auto_vacuum(pool)
+        despues = os.path.getsize(pool.db_path)
+        pool.cerrar()
+        print("Base convertida a auto_vacuum incremental." if convertida
+              else "La base ya estaba en auto_vacuum incremental.")
+        print(f"Base de datos: {antes / 1e6:.2f} MB -> {despues / 1e6:.2f} MB")
+        return 0
+
+    archivados = archivar_inactivos(pool, args.dias, directorio, args.limite)
+    with pool.conexion() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    despues = os.path.getsize(pool.db_path)
+    pool.cerrar()
+
+    print(f"{len(archivados)} chats archivados en {directorio}.")
+    print(f"Base de datos: {antes / 1e6:.2f} MB -> {despues / 1e6:.2f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
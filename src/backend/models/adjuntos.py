@@ -0,0 +1,141 @@
+import hashlib
+import pathlib
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from google.genai import types
+
+from database.storage import ConnectionPool
+
+
+def sha256_archivo(path: pathlib.Path, bloque: int = 1 << 20) -> str:
+    """SHA-256 del archivo leído por bloques, sin cargarlo completo en memoria."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(bloque), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@dataclass
+class Adjunto:
+    sha256: str
+    nombre: str
+    mime_type: str
+    tamano: int
+    ruta: Optional[str] = None
+    file_uri: Optional[str] = None
+    expira: Optional[float] = None
+
+    def part(self) -> types.Part:
+        return types.Part.from_uri(file_uri=self.file_uri, mime_type=self.mime_type)
+
+
+_COLUMNAS = "sha256, nombre, mime_type, tamano, ruta, file_uri, expira"
+
+
+class AlmacenAdjuntos:
+    """
+    Adjuntos direccionados por contenido (SHA-256). Cada archivo se sube una sola vez
+    a la Files API y se reutiliza su URI mientras no expire; los turnos siguientes del
+    chat lo referencian sin volver a enviar los bytes.
+    """
+
+    def __init__(self, client, pool: ConnectionPool, margen_segundos: int = 600):
+        self.client = client
+        self.pool = pool
+        # Una subida que expira dentro de este margen se considera vencida.
+        self.margen_segundos = margen_segundos
+
+    def subir(self, path: pathlib.Path, mime_type: str = "application/pdf") -> Adjunto:
+        """Devuelve el adjunto con una URI vigente, subiendo el archivo solo si hace falta."""
+        sha256 = sha256_archivo(path)
+        with self.pool.conexion() as conn:
+            fila = conn.execute(
+                f"SELECT {_COLUMNAS} FROM Attachment WHERE sha256 = ?", (sha256,)
+            ).fetchone()
+
+        adjunto = Adjunto(*fila) if fila else Adjunto(sha256, path.name, mime_type, path.stat().st_size)
+        ruta_anterior, adjunto.ruta = adjunto.ruta, str(path)
+        if not self.vigente(adjunto):
+            self._subir(adjunto)
+        elif ruta_anterior != adjunto.ruta:
+            with self.pool.transaccion() as conn:
+                conn.execute("UPDATE Attachment SET ruta = ? WHERE sha256 = ?", (adjunto.ruta, sha256))
+        return adjunto
+
+    def refrescar(self, adjunto: Adjunto) -> Optional[Adjunto]:
+        """
+        Para adjuntos leídos del historial: si la subida expiró, se vuelve a subir desde
+        la ruta original siempre que el archivo siga existiendo sin cambios.
+        Devuelve None si ya no es posible referenciarlo.
+        """
+        if self.vigente(adjunto):
+            return adjunto
+        ruta = pathlib.Path(adjunto.ruta) if adjunto.ruta else None
+        if ruta is None or not ruta.exists() or sha256_archivo(ruta) != adjunto.sha256:
+            return None
+        self._subir(adjunto)
+        return adjunto
+
+    def vincular(self, conn: sqlite3.Connection, historial_id: int, adjuntos: Iterable[Adjunto]):
+        conn.executemany(
+            "INSERT OR IGNORE INTO HistorialAttachment (historial_id, sha256) VALUES (?, ?)",
+            [(historial_id, a.sha256) for a in adjuntos]
+        )
+
+    def de_mensajes(self, conn: sqlite3.Connection, chat_id: int, desde_orden: int) -> Dict[int, List[Adjunto]]:
+        """Adjuntos de los mensajes del chat posteriores a `desde_orden`, por historial_id."""
+        cursor = conn.execute(
+            f"""
+            SELECT ha.historial_id, {', '.join('a.' + c for c in _COLUMNAS.split(', '))}
+            FROM HistorialAttachment AS ha
+            JOIN Historial AS h ON h.id = ha.historial_id
+            JOIN Attachment AS a ON a.sha256 = ha.sha256
+            WHERE h.chat_id = ? AND h.orden > ?
+            """,
+            (chat_id, desde_orden)
+        )
+        adjuntos: Dict[int, List[Adjunto]] = {}
+        for fila in cursor.fetchall():
+            adjuntos.setdefault(fila[0], []).append(Adjunto(*fila[1:]))
+        return adjuntos
+
+    def del_resumen(self, conn: sqlite3.Connection, chat_id: int, hasta_orden: int) -> List[Adjunto]:
+        """Adjuntos distintos de los mensajes ya resumidos (`orden` <= `hasta_orden`)."""
+        cursor = conn.execute(
+            f"""
+            SELECT {', '.join('a.' + c for c in _COLUMNAS.split(', '))}
+            FROM Attachment AS a
+            WHERE a.sha256 IN (
+                SELECT ha.sha256 FROM HistorialAttachment AS ha
+                JOIN Historial AS h ON h.id = ha.historial_id
+                WHERE h.chat_id = ? AND h.orden <= ?
+            )
+            """,
+            (chat_id, hasta_orden)
+        )
+        return [Adjunto(*fila) for fila in cursor.fetchall()]
+
+    def vigente(self, adjunto: Adjunto) -> bool:
+        """True si la URI de la Files API sigue siendo válida, con margen."""
+        return bool(adjunto.file_uri) and (adjunto.expira or 0) > time.time() + self.margen_segundos
+
+    def _subir(self, adjunto: Adjunto):
+        archivo = self.client.files.upload(
+            file=adjunto.ruta,
+            config=types.UploadFileConfig(mime_type=adjunto.mime_type, display_name=adjunto.nombre),
+        )
+        adjunto.file_uri = archivo.uri
+        adjunto.expira = archivo.expiration_time.timestamp() if archivo.expiration_time else None
+
+        with self.pool.transaccion() as conn:
+            conn.execute(
+                f"INSERT INTO Attachment ({_COLUMNAS}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (sha256) DO UPDATE SET "
+                "ruta = excluded.ruta, file_uri = excluded.file_uri, expira = excluded.expira",
+                (adjunto.sha256, adjunto.nombre, adjunto.mime_type, adjunto.tamano,
+                 adjunto.ruta, adjunto.file_uri, adjunto.expira)
+            )
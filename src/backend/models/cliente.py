@@ -0,0 +1,63 @@
+import os
+import threading
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+# El .env se lee al importar este módulo, que solo se carga al llegar a la guía o al
+# chat. gemini.py lo importa antes de leer sus variables y las de limitador.py; los
+# módulos de database leen las suyas (TESISIA_CODEC, TESISIA_METRICAS, ...) al usarlas,
+# nunca al importarse, porque storage se carga al arrancar, antes que este módulo.
+load_dotenv()
+
+# Conexiones HTTP que el cliente mantiene abiertas (keep-alive) y tiempos de espera.
+MAX_CONEXIONES = int(os.getenv("TESISIA_HTTP_CONEXIONES", "16"))
+MAX_KEEPALIVE = int(os.getenv("TESISIA_HTTP_KEEPALIVE", "8"))
+KEEPALIVE_SEGUNDOS = float(os.getenv("TESISIA_HTTP_KEEPALIVE_SEGUNDOS", "120"))
+TIMEOUT_MS = int(os.getenv("TESISIA_HTTP_TIMEOUT_MS", "120000"))
+
+_cliente: Optional[genai.Client] = None
+_lock = threading.Lock()
+
+
+def _http_options() -> types.HttpOptions:
+    limites = httpx.Limits(
+        max_connections=MAX_CONEXIONES,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_SEGUNDOS,
+    )
+    return types.HttpOptions(
+        timeout=TIMEOUT_MS,
+        client_args={"limits": limites},
+        async_client_args={"limits": limites},
+    )
+
+
+def obtener_cliente() -> genai.Client:
+    """
+    Cliente de genai compartido por todo el proceso. Sus conexiones HTTP quedan
+    abiertas entre llamadas, así cada sesión o chat nuevo no repite el handshake TLS.
+    La API key se valida aquí, la primera vez que se necesita el cliente.
+    """
+    global _cliente
+    with _lock:
+        if _cliente is None:
+            api_key = os.getenv("GOOGLE_GENAI_API_KEY")
+            if not api_key:
+                raise ValueError("No se encontró la variable de entorno 'GOOGLE_GENAI_API_KEY'")
+            _cliente = genai.Client(api_key=api_key, http_options=_http_options())
+        return _cliente
+
+
+async def calentar_async(client: genai.Client, modelo: str):
+    """
+    Abre una conexión del cliente asíncrono (client.aio), que usa la interfaz, con una
+    llamada liviana. Debe correr en el mismo bucle de eventos que luego hará las llamadas.
+    """
+    try:
+        await client.aio.models.get(model=modelo)
+    except Exception as e:
+        print(f"No se pudo precalentar la conexión con Gemini: {e}")
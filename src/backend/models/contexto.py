@@ -0,0 +1,193 @@
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from google.genai import types
+
+from database.storage import ConnectionPool
+
+PROMPT_RESUMEN = (
+    "Resume la siguiente conversación entre un estudiante y Anglai, su asistente de tesis. "
+    "Conserva el título y tema de la tesis, los objetivos, los autores y citas APA mencionados, "
+    "las decisiones tomadas y lo que quedó pendiente. Responde solo con el resumen, en viñetas."
+)
+
+
+# Estimación gruesa del costo en tokens de un PDF adjunto (~258 tokens por página).
+TOKENS_POR_ADJUNTO = 2600
+
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación local (~4 caracteres por token), suficiente para decidir cuándo resumir."""
+    return len(texto) // 4 + 1
+
+
+@dataclass
+class Mensaje:
+    # None mientras el mensaje espera en la cola de escritura.
+    orden: Optional[int]
+    role: str
+    texto: str
+    content: types.Content
+    tokens: int
+    # Adjuntos (backend.models.adjuntos.Adjunto) referenciados en `content`.
+    adjuntos: list = field(default_factory=list)
+
+
+class HistorialChat:
+    """
+    Historial en memoria de un chat: el resumen acumulado de los turnos viejos y
+    los mensajes posteriores a ese resumen. Los adjuntos de los turnos resumidos
+    siguen en el contexto, junto al resumen, para que el PDF no se pierda al resumir.
+    """
+
+    def __init__(self, mensajes: List[Mensaje], resumen: Optional[str] = None,
+                 resumen_hasta: int = 0, adjuntos_resumen: Optional[list] = None):
+        self.lock = threading.Lock()
+        self.mensajes = mensajes
+        self.resumen = None
+        self.resumen_hasta = resumen_hasta
+        self.adjuntos_resumen: list = adjuntos_resumen or []
+        self._resumen_contents: List[types.Content] = []
+        self.tokens = sum(m.tokens for m in mensajes)
+        if resumen:
+            self._fijar_resumen(resumen)
+
+    def _tokens_resumen(self) -> int:
+        if not self.resumen:
+            return 0
+        return estimar_tokens(self.resumen) + TOKENS_POR_ADJUNTO * len(self.adjuntos_resumen)
+
+    def _fijar_resumen(self, resumen: str, adjuntos: Optional[list] = None):
+        self.tokens -= self._tokens_resumen()
+        self.resumen = resumen
+        if adjuntos is not None:
+            self.adjuntos_resumen = adjuntos
+        self.tokens += self._tokens_resumen()
+        parts = [a.part() for a in self.adjuntos_resumen]
+        parts.append(types.Part(text=f"Resumen de la conversación anterior:\n{resumen}"))
+        self._resumen_contents = [
+            types.Content(role="user", parts=parts),
+            types.Content(role="model", parts=[types.Part(text="Entendido, continúo a partir de ese resumen.")]),
+        ]
+
+    def reemplazar_adjuntos_resumen(self, adjuntos: list):
+        """Cambia los adjuntos del resumen (p. ej. renovados o vencidos); llamar con `lock` tomado."""
+        if self.resumen:
+            self._fijar_resumen(self.resumen, adjuntos)
+        else:
+            self.adjuntos_resumen = adjuntos
+
+    def agregar(self, mensaje: Mensaje):
+        with self.lock:
+            self.mensajes.append(mensaje)
+            self.tokens += mensaje.tokens
+
+    def aplicar_resumen(self, resumen: str, hasta_orden: int, cantidad: int):
+        """Reemplaza los primeros `cantidad` mensajes por el resumen (llamar con `lock` tomado)."""
+        adjuntos = list(self.adjuntos_resumen)
+        vistos = {a.sha256 for a in adjuntos}
+        for m in self.mensajes[:cantidad]:
+            for a in m.adjuntos:
+                if a.sha256 not in vistos:
+                    vistos.add(a.sha256)
+                    adjuntos.append(a)
+        self.tokens -= sum(m.tokens for m in self.mensajes[:cantidad])
+        del self.mensajes[:cantidad]
+        self.resumen_hasta = hasta_orden
+        self._fijar_resumen(resumen, adjuntos)
+
+    def contents(self) -> List[types.Content]:
+        return self._resumen_contents + [m.content for m in self.mensajes]
+
+
+class GestorContexto:
+    """
+    Mantiene el contexto enviado al modelo dentro de un presupuesto de tokens.
+    Cuando el historial lo supera, condensa los turnos viejos en un resumen que se
+    guarda en la tabla Resumen y envía solo el resumen más una ventana reciente.
+    """
+
+    def __init__(self, client, pool: ConnectionPool, modelo: str,
+                 presupuesto_tokens: int = 32000, fraccion_ventana: float = 0.5,
+                 contar_con_api: bool = False, limitador=None, escritor=None):
+        self.client = client
+        self.pool = pool
+        self.modelo = modelo
+        self.presupuesto_tokens = presupuesto_tokens
+        self.fraccion_ventana = fraccion_ventana
+        # Si es True, la estimación local se confirma con count_tokens antes de resumir.
+        self.contar_con_api = contar_con_api
+        # LimitadorGemini opcional: el resumen también consume la cuota del proyecto.
+        self.limitador = limitador
+        # EscritorHistorial opcional: antes de resumir se espera a que los mensajes
+        # estén guardados, para conocer su `orden`.
+        self.escritor = escritor
+
+    def contents(self, chat_id: int, historial: HistorialChat) -> List[types.Content]:
+        with historial.lock:
+            if self._excede(historial):
+                if self.escritor is not None:
+                    self.escritor.flush()
+                self._resumir(chat_id, historial)
+            return historial.contents()
+
+    def _excede(self, historial: HistorialChat) -> bool:
+        if historial.tokens <= self.presupuesto_tokens:
+            return False
+        if not self.contar_con_api:
+            return True
+        conteo = self.client.models.count_tokens(model=self.modelo, contents=historial.contents())
+        return conteo.total_tokens > self.presupuesto_tokens
+
+    def _resumir(self, chat_id: int, historial: HistorialChat):
+        mensajes = historial.mensajes
+        limite_ventana = int(self.presupuesto_tokens * self.fraccion_ventana)
+
+        # La ventana reciente se toma desde el final hasta llenar su parte del presupuesto,
+        # empieza siempre en un mensaje del usuario e incluye al menos el último mensaje.
+        corte = len(mensajes)
+        acumulado = 0
+        while corte > 0 and acumulado + mensajes[corte - 1].tokens <= limite_ventana:
+            corte -= 1
+            acumulado += mensajes[corte].tokens
+        while corte < len(mensajes) and mensajes[corte].role != "user":
+            corte += 1
+        corte = min(corte, len(mensajes) - 1)
+        if corte <= 0:
+            return
+
+        antiguos = mensajes[:corte]
+        hasta_orden = antiguos[-1].orden
+        if hasta_orden is None:
+            # El mensaje no llegó a guardarse: sin su `orden` el resumen no se puede ubicar.
+            return
+        resumen = self._generar_resumen(historial.resumen, antiguos)
+
+        with self.pool.transaccion() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO Resumen (chat_id, hasta_orden, contenido) VALUES (?, ?, ?)",
+                (chat_id, hasta_orden, resumen)
+            )
+        historial.aplicar_resumen(resumen, hasta_orden, corte)
+
+    def _generar_resumen(self, resumen_previo: Optional[str], mensajes: List[Mensaje]) -> str:
+        partes = []
+        if resumen_previo:
+            partes.append(f"Resumen previo:\n{resumen_previo}")
+        for m in mensajes:
+            autor = "Estudiante" if m.role == "user" else "Anglai"
+            adjuntos = "".join(f" [adjunto: {a.nombre}]" for a in m.adjuntos)
+            partes.append(f"{autor}: {m.texto}{adjuntos}")
+
+        texto = "\n\n".join(partes)
+
+        def llamar():
+            return self.client.models.generate_content(
+                model=self.modelo,
+                contents=[types.Content(role="user", parts=[types.Part(text=texto)])],
+                config=types.GenerateContentConfig(system_instruction=PROMPT_RESUMEN),
+            )
+        if self.limitador is None:
+            return llamar().text
+        return self.limitador.ejecutar(llamar, estimar_tokens(texto)).text
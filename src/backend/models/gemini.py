@@ -1,29 +1,149 @@
+import asyncio
 import os
-from dotenv import load_dotenv
 # import google.generativeai as genai
 # from google.generativeai import types
-from google import genai
-from google.genai import types
+from google.genai import errors, types
 import pathlib
 import sqlite3
-from typing import List, Dict, Optional
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Sequence, Tuple
 from datetime import datetime
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..', 'database'))
-from database.setup_database import setup_database
+from database.archivo import archivar_inactivos, rehidratar
+from database.busqueda import buscar_mensajes
+from database.codec import descomprimir
+from database.escritura import get_escritor
+from database.metricas import get_registro
+from database.storage import get_pool, init_storage
+from backend.models.adjuntos import Adjunto, AlmacenAdjuntos
+from backend.models.cliente import calentar_async, obtener_cliente
+from backend.models.contexto import TOKENS_POR_ADJUNTO, GestorContexto, HistorialChat, Mensaje, estimar_tokens
+from backend.models.historial_cache import HISTORIAL_CACHE, HistorialCache
+from backend.models.limitador import LIMITADOR, LimitadorGemini
+from backend.models.prompt_cache import cache_compartida
+from backend.models.respuesta_cache import RESPUESTA_CACHE, RespuestaCache
+from backend.models.single_flight import SINGLE_FLIGHT, huella
+from backend.models.traza import Traza
 
 
-load_dotenv()
-API_KEY = os.getenv("GOOGLE_GENAI_API_KEY")
+MODELO = "gemini-2.0-flash"
+# Si es "0", no se abre la conexión con la API antes del primer mensaje.
+PRECALENTAR = os.getenv("TESISIA_PRECALENTAR", "1") != "0"
+# Tokens de historial que se envían como máximo antes de resumir los turnos viejos.
+PRESUPUESTO_TOKENS = int(os.getenv("TESISIA_PRESUPUESTO_TOKENS", "32000"))
 
-if not API_KEY:
-    raise ValueError("No se encontró la variable de entorno 'GOOGLE_GENAI_API_KEY'")
+
+def _contenido(role: str, texto: str, adjuntos: Sequence[Adjunto] = ()) -> types.Content:
+    parts = [a.part() for a in adjuntos]
+    parts.append(types.Part(text=texto))
+    return types.Content(role=role, parts=parts)
+
+
+def _tokens_estimados(contents: List[types.Content]) -> int:
+    return sum(estimar_tokens(p.text) if p.text is not None else TOKENS_POR_ADJUNTO
+               for c in contents for p in c.parts)
+
+
+def _tokens_respuesta(response) -> Optional[int]:
+    uso = getattr(response, "usage_metadata", None)
+    return getattr(uso, "candidates_token_count", None) if uso else None
+
+
+def _mensaje(orden: int, role: str, texto: str, adjuntos: Sequence[Adjunto] = ()) -> Mensaje:
+    tokens = estimar_tokens(texto) + TOKENS_POR_ADJUNTO * len(adjuntos)
+    return Mensaje(orden, role, texto, _contenido(role, texto, adjuntos), tokens, list(adjuntos))
+
+
+@dataclass
+class _Turno:
+    """Lo necesario para hacer la llamada al modelo y cerrar el turno."""
+    chat_id: int
+    contents: List[types.Content]
+    config: Optional[types.GenerateContentConfig] = None
+    clave_cache: Optional[str] = None
+    respuesta_cacheada: Optional[str] = None
+    huella: Optional[str] = None
+    tokens: int = 0
+    traza: Optional[Traza] = None
+    # True si este turno hizo la llamada al modelo; False si se sumó a una idéntica en
+    # curso (single-flight). Solo quien la hizo registra el uso de tokens en las métricas.
+    lider: bool = False
+
+    def uso_propio(self, uso: Optional["Uso"]) -> Optional["Uso"]:
+        return uso if self.lider else None
+
+
+Uso = types.GenerateContentResponseUsageMetadata
+
+
+@dataclass
+class Respuesta:
+    """Resultado de un turno. `uso` es None si la respuesta salió de la caché."""
+    chat_id: int
+    texto: str
+    uso: Optional[Uso] = None
+    cacheada: bool = False
+
+
+class RespuestaStream:
+    """
+    Respuesta en streaming: se itera una sola vez por fragmentos de texto. Al terminar,
+    `texto` tiene la respuesta completa y `uso` el consumo de tokens.
+    """
+
+    def __init__(self, chat_id: int, partes, cacheada: bool = False):
+        self.chat_id = chat_id
+        self.texto = ""
+        self.uso: Optional[Uso] = None
+        self.cacheada = cacheada
+        self._partes = partes
+
+    def _acumular(self, texto: str, uso: Optional[Uso]) -> str:
+        if uso is not None:
+            self.uso = uso
+        self.texto += texto
+        return texto
+
+    def __iter__(self) -> Iterator[str]:
+        for texto, uso in self._partes:
+            if self._acumular(texto, uso):
+                yield texto
+
+
+class RespuestaStreamAsync(RespuestaStream):
+    """Igual que RespuestaStream, pero se recorre con `async for`."""
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        async for texto, uso in self._partes:
+            if self._acumular(texto, uso):
+                yield texto
+
+
+async def precalentar_async():
+    """Abre la conexión con la API mientras el usuario aún no escribe su primer mensaje."""
+    if PRECALENTAR:
+        await calentar_async(obtener_cliente(), MODELO)
 
 
 class Gemini:
-    def __init__(self):
-        self.client = genai.Client(api_key=API_KEY)
-        self.current_chat_id = None
+    def __init__(self, historial_cache: Optional[HistorialCache] = None,
+                 presupuesto_tokens: int = PRESUPUESTO_TOKENS,
+                 respuesta_cache: Optional[RespuestaCache] = None,
+                 limitador: Optional[LimitadorGemini] = None):
+        self.client = obtener_cliente()
+        self.pool = get_pool()
+        # Los mensajes se guardan en segundo plano, en transacciones agrupadas.
+        self.escritor = get_escritor()
+        # Latencia por etapa y tokens de cada solicitud (ver reporte_metricas.py).
+        self.metricas = get_registro()
+        self.historial_cache = historial_cache or HISTORIAL_CACHE
+        self.respuesta_cache = respuesta_cache or RESPUESTA_CACHE
+        # Solicitudes idénticas simultáneas comparten una sola llamada al modelo.
+        self.single_flight = SINGLE_FLIGHT
+        # Cuota de solicitudes/tokens por minuto, tope de concurrencia y reintentos.
+        self.limitador = limitador or LIMITADOR
+        self.adjuntos = AlmacenAdjuntos(self.client, self.pool)
+        self.contexto = GestorContexto(self.client, self.pool, MODELO, presupuesto_tokens,
+                                       limitador=self.limitador, escritor=self.escritor)
         self._system_prompt_text = """Actúa como Anglai, un asistente experto y riguroso en lineamientos de trabajos especiales de grado, especializado en normativas académicas, específicamente las normas APA 7ma edición. 
             Tu objetivo principal es guiar a los estudiantes en la formulación y desarrollo de sus tesis con precisión y estructura. "
             "Para cada sección, considera las siguientes directrices estrictas:"
@@ -51,162 +171,505 @@ class Gemini:
             "   - Detalla el tipo de investigación, diseño, población, muestra, técnicas e instrumentos de recolección de datos, y el plan de análisis, todo conforme a las normas académicas."
             "Además de estas directrices, puedes ayudar a generar ideas para mapas mentales sobre los temas de tesis, facilitando la organización de ideas y conceptos complejos. "
             "Siempre que proporciones información, asegúrate de que esté redactada bajo los principios de las normas APA 7ma edición, ademas de que no respondas con asteriscos, solo vinetas."""
+        # Las instrucciones viajan como system_instruction (o como caché del servidor),
+        # no como un mensaje más del historial.
+        self.prompt_cache = cache_compartida(self.client, MODELO, self._system_prompt_text)
+        self._tokens_prompt = estimar_tokens(self._system_prompt_text)
         
         
-    def _get_db_connection(self) -> sqlite3.Connection:
-        conn = sqlite3.connect('tesisIA.db')
-        setup_database(conn) 
-        return conn
-
     def _crear_nuevo_chat(self, user_id: int, titulo: str = "Nuevo chat") -> int:
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
+        # El chat se crea en el momento: su id se devuelve a la interfaz.
+        with self.pool.transaccion() as conn:
+            cursor = conn.execute(
                 "INSERT INTO Chat (user_id, titulo) VALUES (?, ?)",
                 (user_id, titulo)
             )
-            conn.commit()
             chat_id = cursor.lastrowid
-            self._guardar_mensaje(chat_id, "user", self._system_prompt_text)
-            return chat_id
-        finally:
-            conn.close()
-    
-    def _guardar_mensaje(self, chat_id: int, role: str, contenido: str) -> int:
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "SELECT COALESCE(MAX(orden), 0) + 1 FROM Historial WHERE chat_id = ?",
-                (chat_id,)
-            )
-            orden = cursor.fetchone()[0]
-            
-            cursor.execute(
-                "INSERT INTO Historial (chat_id, orden, role, contenido) VALUES (?, ?, ?, ?)",
-                (chat_id, orden, role, contenido)
-            )
-            conn.commit()
-            return cursor.lastrowid
-        finally:
-            conn.close() 
+        self.historial_cache.guardar(chat_id, HistorialChat([]))
+        return chat_id
     
-    def _cargar_historial(self, chat_id: int) -> List[Dict[str, str]]:
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "SELECT role, contenido FROM Historial WHERE chat_id = ? ORDER BY orden",
+    def _cargar_historial(self, chat_id: int) -> HistorialChat:
+        """Lee el historial vigente del chat: el resumen guardado y los mensajes posteriores a él."""
+        # Un chat archivado vuelve a Historial la primera vez que se abre.
+        rehidratar(self.pool, chat_id)
+        with self.pool.conexion() as conn:
+            fila = conn.execute(
+                "SELECT hasta_orden, contenido FROM Resumen WHERE chat_id = ?",
                 (chat_id,)
+            ).fetchone()
+            resumen_hasta, resumen = fila if fila else (0, None)
+
+            cursor = conn.execute(
+                "SELECT id, orden, role, contenido, codec FROM Historial WHERE chat_id = ? AND orden > ? ORDER BY orden",
+                (chat_id, resumen_hasta)
             )
-            return [{"role": row[0], "content": row[1]} for row in cursor.fetchall()]
-        finally:
-            conn.close() 
+            filas = cursor.fetchall()
+            adjuntos = self.adjuntos.de_mensajes(conn, chat_id, resumen_hasta)
+            adjuntos_resumen = self.adjuntos.del_resumen(conn, chat_id, resumen_hasta) if resumen else []
+
+        # Las URIs vencidas se renuevan en _renovar_adjuntos, como las de un chat en caché.
+        mensajes = [_mensaje(orden, role, descomprimir(contenido, codec), adjuntos.get(historial_id, []))
+                    for historial_id, orden, role, contenido, codec in filas]
+        return HistorialChat(mensajes, resumen, resumen_hasta, adjuntos_resumen)
+
+    def _renovar_adjuntos(self, historial: HistorialChat):
+        """
+        Las URIs de la Files API vencen (~48 h) aunque el chat siga en caché: antes de
+        cada envío se vuelven a subir las vencidas, o se quitan del contexto si el archivo
+        ya no está disponible. Un mismo PDF (mismo sha256) adjunto en varios mensajes se
+        vuelve a subir una sola vez y todos usan la URI nueva.
+        """
+        renovados: Dict[str, Optional[Adjunto]] = {}
+
+        def renovar(adjunto: Adjunto) -> Optional[Adjunto]:
+            if self.adjuntos.vigente(adjunto):
+                return adjunto
+            if adjunto.sha256 not in renovados:
+                renovados[adjunto.sha256] = self.adjuntos.refrescar(adjunto)
+            return renovados[adjunto.sha256]
+
+        with historial.lock:
+            for m in historial.mensajes:
+                if m.adjuntos and not all(map(self.adjuntos.vigente, m.adjuntos)):
+                    vigentes = [a for a in map(renovar, m.adjuntos) if a]
+                    # Se modifica en el lugar: al_confirmar aún puede completar su `orden`.
+                    historial.tokens -= TOKENS_POR_ADJUNTO * (len(m.adjuntos) - len(vigentes))
+                    m.adjuntos = vigentes
+                    m.tokens = estimar_tokens(m.texto) + TOKENS_POR_ADJUNTO * len(vigentes)
+                    m.content = _contenido(m.role, m.texto, vigentes)
+            if not all(map(self.adjuntos.vigente, historial.adjuntos_resumen)):
+                historial.reemplazar_adjuntos_resumen(
+                    [a for a in map(renovar, historial.adjuntos_resumen) if a]
+                )
+
+    def _agregar_al_historial(self, chat_id: int, role: str, texto: str,
+                              adjuntos: Sequence[Adjunto] = ()):
+        """
+        Agrega el mensaje a la caché si el chat ya está cargado y lo encola para
+        guardarlo en Historial sin esperar al disco. Su `orden` se completa al guardarse.
+        """
+        mensaje = _mensaje(None, role, texto, adjuntos)
+
+        def al_confirmar(historial_id: int, orden: int):
+            mensaje.orden = orden
+
+        def vincular(conn: sqlite3.Connection, historial_id: int):
+            self.adjuntos.vincular(conn, historial_id, adjuntos)
+
+        self.escritor.encolar(chat_id, role, texto, vincular if adjuntos else None, al_confirmar)
+        self.historial_cache.agregar(chat_id, mensaje)
+
+    def _contents_chat(self, chat_id: int, traza: Traza) -> List[types.Content]:
+        """
+        Contexto del chat listo para enviar, dentro del presupuesto de tokens.
+        Solo se lee de la base si el chat no está en caché.
+        """
+        historial = self.historial_cache.obtener(chat_id)
+        if historial is None:
+            with traza.etapa("cargar_historial"):
+                self.escritor.flush()
+                historial = self._cargar_historial(chat_id)
+            self.historial_cache.guardar(chat_id, historial)
+        with traza.etapa("armar_contexto"):
+            self._renovar_adjuntos(historial)
+            return self.contexto.contents(chat_id, historial)
     
-    def generar_respuesta(self, prompt: str, chat_id: Optional[int] = None, user_id: Optional[int] = None) -> str:
+    def _resolver_chat(self, chat_id: Optional[int], user_id: Optional[int], traza: Traza) -> int:
         if chat_id is None:
             if user_id is None:
                 raise ValueError("Se requiere user_id para crear un nuevo chat si chat_id es None.")
-            chat_id = self._crear_nuevo_chat(user_id)
-            self.current_chat_id = chat_id 
-        else:
-            self.current_chat_id = chat_id 
+            with traza.etapa("crear_chat"):
+                chat_id = self._crear_nuevo_chat(user_id)
+        traza.chat_id = chat_id
+        return chat_id
 
-        self._guardar_mensaje(chat_id, "user", prompt)
-        
-        historial = self._cargar_historial(chat_id)
-        
-        contents = [types.Content(role=msg["role"], parts=[types.Part(text=msg["content"])]) 
-                    for msg in historial]
-        
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=contents
-        )
-        
-        self._guardar_mensaje(chat_id, "model", response.text)
-        return response.text
-    
-    def evaluar_pdf(self, pdf_path: pathlib.Path, prompt: str, chat_id: Optional[int] = None, 
-                     user_id: Optional[int] = None) -> str:
+    def _preparar_turno(self, prompt: str, chat_id: Optional[int], user_id: Optional[int],
+                        traza: Traza) -> _Turno:
+        """
+        Crea el chat si hace falta, guarda el prompt y arma el contenido a enviar.
+        Si la misma solicitud ya fue respondida, trae la respuesta de la caché.
+        """
+        chat_id = self._resolver_chat(chat_id, user_id, traza)
+
+        with traza.etapa("guardar_prompt"):
+            self._agregar_al_historial(chat_id, "user", prompt)
+        contents = self._contents_chat(chat_id, traza)
+
+        with traza.etapa("cache_respuesta"):
+            clave = self.respuesta_cache.clave(MODELO, self._system_prompt_text, contents)
+            cacheada = self.respuesta_cache.obtener(clave)
+        if cacheada is not None:
+            return _Turno(chat_id, contents, clave_cache=clave, respuesta_cacheada=cacheada, traza=traza)
+        return _Turno(chat_id, contents, self.prompt_cache.config(), clave,
+                      huella=huella(MODELO, self._system_prompt_text, contents),
+                      tokens=self._tokens_prompt + _tokens_estimados(contents), traza=traza)
+
+    def _preparar_pdf(self, pdf_path: pathlib.Path, prompt: str, chat_id: Optional[int],
+                      user_id: Optional[int], traza: Traza) -> _Turno:
         if not pdf_path.exists():
             raise FileNotFoundError(f"No se encontró el archivo: {pdf_path}")
-            
-        if chat_id is None:
-            if user_id is None:
-                raise ValueError("Se requiere user_id para crear un nuevo chat si chat_id es None.")
-            chat_id = self._crear_nuevo_chat(user_id)
-            self.current_chat_id = chat_id
-        else:
-            self.current_chat_id = chat_id
 
-        self._guardar_mensaje(chat_id, "user", prompt)
-        
-        historial = self._cargar_historial(chat_id)[:-1] 
-        
-        contents = [types.Content(role=msg["role"], parts=[types.Part(text=msg["content"])]) 
-                    for msg in historial]
-        
-        contents.append(types.Blob(
-            mime_type='application/pdf',
-            data=pdf_path.read_bytes()
-        ))
-        contents.append(types.Content(role="user", parts=[types.Part(text=prompt)]))
-        
-        response = self.client.models.generate_content(
-            model="gemini-2.0-flash",
-            contents=contents
-        )
-        
-        self._guardar_mensaje(chat_id, "model", response.text)
-        
-        return response.text
-    
-    def obtener_chats_usuario(self, user_id: int) -> List[Dict]:
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
+        chat_id = self._resolver_chat(chat_id, user_id, traza)
+
+        # El PDF se sube una sola vez (por su SHA-256) y el mensaje queda vinculado a él,
+        # así los turnos siguientes del chat lo siguen referenciando sin reenviarlo.
+        with traza.etapa("subir_pdf"):
+            adjunto = self.adjuntos.subir(pdf_path)
+        with traza.etapa("guardar_prompt"):
+            self._agregar_al_historial(chat_id, "user", prompt, [adjunto])
+        contents = self._contents_chat(chat_id, traza)
+        return _Turno(chat_id, contents, self.prompt_cache.config(),
+                      huella=huella(MODELO, self._system_prompt_text, contents),
+                      tokens=self._tokens_prompt + _tokens_estimados(contents), traza=traza)
+
+    def _finalizar_turno(self, turno: _Turno, texto: str):
+        with turno.traza.etapa("persistir"):
+            self._agregar_al_historial(turno.chat_id, "model", texto)
+            if turno.respuesta_cacheada is None:
+                self.respuesta_cache.guardar(turno.clave_cache, texto)
+
+    # Las llamadas pasan por el limitador dentro del single-flight: las solicitudes
+    # agrupadas consumen una sola vez la cuota. Devuelven (texto, uso) y los streams
+    # fragmentos (texto, uso), donde el uso llega con el último.
+
+    # Si el servidor ya no tiene la caché del prompt que lleva turno.config, se
+    # descarta y la llamada se repite una vez con el prompt inline.
+
+    def _sin_cache_vencida(self, turno: _Turno, error: Exception) -> bool:
+        if not isinstance(error, errors.APIError) or not self.prompt_cache.es_cache_vencida(turno.config, error):
+            return False
+        self.prompt_cache.invalidar(turno.config.cached_content)
+        turno.config = self.prompt_cache.config_inline()
+        return True
+
+    def _llamar_modelo(self, turno: _Turno) -> Tuple[str, Optional[Uso]]:
+        def generar():
+            return self.limitador.ejecutar(
+                lambda: self.client.models.generate_content(
+                    model=MODELO,
+                    contents=turno.contents,
+                    config=turno.config
+                ),
+                turno.tokens
+            )
+
+        def llamar():
+            turno.lider = True
+            try:
+                response = generar()
+            except Exception as e:
+                if not self._sin_cache_vencida(turno, e):
+                    raise
+                response = generar()
+            self.limitador.registrar_uso(_tokens_respuesta(response))
+            return response.text, response.usage_metadata
+        return self.single_flight.hacer(turno.huella, llamar)
+
+    def _stream_modelo(self, turno: _Turno) -> Iterator[Tuple[str, Optional[Uso]]]:
+        def generar():
+            return self.limitador.stream(
+                lambda: self.client.models.generate_content_stream(
+                    model=MODELO,
+                    contents=turno.contents,
+                    config=turno.config
+                ),
+                turno.tokens
+            )
+
+        turno.lider = True
+        ultimo = None
         try:
-            cursor.execute(
-                "SELECT id, titulo, fecha_creacion FROM Chat WHERE user_id = ? ORDER BY fecha_creacion DESC",
-                (user_id,)
+            for chunk in generar():
+                ultimo = chunk
+                yield chunk.text or "", chunk.usage_metadata
+        except Exception as e:
+            # Una caché vencida falla antes del primer fragmento.
+            if ultimo is not None or not self._sin_cache_vencida(turno, e):
+                raise
+            for chunk in generar():
+                ultimo = chunk
+                yield chunk.text or "", chunk.usage_metadata
+        self.limitador.registrar_uso(_tokens_respuesta(ultimo))
+
+    async def _llamar_modelo_async(self, turno: _Turno) -> Tuple[str, Optional[Uso]]:
+        async def generar():
+            return await self.limitador.ejecutar_async(
+                lambda: self.client.aio.models.generate_content(
+                    model=MODELO,
+                    contents=turno.contents,
+                    config=turno.config
+                ),
+                turno.tokens
+            )
+
+        async def llamar():
+            turno.lider = True
+            try:
+                response = await generar()
+            except Exception as e:
+                if not self._sin_cache_vencida(turno, e):
+                    raise
+                response = await generar()
+            self.limitador.registrar_uso(_tokens_respuesta(response))
+            return response.text, response.usage_metadata
+        return await self.single_flight.hacer_async(turno.huella, llamar)
+
+    async def _stream_modelo_async(self, turno: _Turno) -> AsyncIterator[Tuple[str, Optional[Uso]]]:
+        turno.lider = True
+
+        def generar():
+            return self.limitador.stream_async(
+                lambda: self.client.aio.models.generate_content_stream(
+                    model=MODELO,
+                    contents=turno.contents,
+                    config=turno.config
+                ),
+                turno.tokens
             )
+
+        async def chunks():
+            ultimo = None
+            try:
+                async for chunk in generar():
+                    ultimo = chunk
+                    yield chunk.text or "", chunk.usage_metadata
+            except Exception as e:
+                # Una caché vencida falla antes del primer fragmento.
+                if ultimo is not None or not self._sin_cache_vencida(turno, e):
+                    raise
+                async for chunk in generar():
+                    ultimo = chunk
+                    yield chunk.text or "", chunk.usage_metadata
+            self.limitador.registrar_uso(_tokens_respuesta(ultimo))
+        return chunks()
+
+    # En los streams, "modelo" va del pedido al último fragmento e incluye el tiempo
+    # que tarda quien consume cada fragmento; "primer_token" se mide desde el inicio.
+
+    def _partes_stream(self, turno: _Turno) -> Iterator[Tuple[str, Optional[Uso]]]:
+        traza = turno.traza
+        with traza.registrar_errores():
+            if turno.respuesta_cacheada is not None:
+                traza.marcar("primer_token")
+                yield turno.respuesta_cacheada, None
+                self._finalizar_turno(turno, turno.respuesta_cacheada)
+                traza.terminar(cacheada=True)
+                return
+
+            partes = []
+            ultimo_uso = None
+            with traza.etapa("modelo"):
+                for texto, uso in self.single_flight.stream(turno.huella, lambda: self._stream_modelo(turno)):
+                    if texto:
+                        traza.marcar("primer_token")
+                    ultimo_uso = uso or ultimo_uso
+                    partes.append(texto)
+                    yield texto, uso
+            self._finalizar_turno(turno, "".join(partes))
+            traza.terminar(turno.uso_propio(ultimo_uso))
+
+    async def _partes_stream_async(self, turno: _Turno) -> AsyncIterator[Tuple[str, Optional[Uso]]]:
+        traza = turno.traza
+        with traza.registrar_errores():
+            if turno.respuesta_cacheada is not None:
+                traza.marcar("primer_token")
+                yield turno.respuesta_cacheada, None
+                await asyncio.to_thread(self._finalizar_turno, turno, turno.respuesta_cacheada)
+                traza.terminar(cacheada=True)
+                return
+
+            partes = []
+            ultimo_uso = None
+            with traza.etapa("modelo"):
+                async for texto, uso in self.single_flight.stream_async(
+                    turno.huella, lambda: self._stream_modelo_async(turno)
+                ):
+                    if texto:
+                        traza.marcar("primer_token")
+                    ultimo_uso = uso or ultimo_uso
+                    partes.append(texto)
+                    yield texto, uso
+            await asyncio.to_thread(self._finalizar_turno, turno, "".join(partes))
+            traza.terminar(turno.uso_propio(ultimo_uso))
+
+    # Los métodos públicos no dejan estado en la instancia: todo lo del turno viaja
+    # en el resultado, así una misma instancia atiende varios chats a la vez.
+
+    def generar_respuesta(self, prompt: str, chat_id: Optional[int] = None,
+                          user_id: Optional[int] = None) -> Respuesta:
+        traza = Traza(self.metricas, "respuesta", user_id, chat_id)
+        with traza.registrar_errores():
+            turno = self._preparar_turno(prompt, chat_id, user_id, traza)
+            if turno.respuesta_cacheada is not None:
+                texto, uso = turno.respuesta_cacheada, None
+            else:
+                with traza.etapa("modelo"):
+                    texto, uso = self._llamar_modelo(turno)
+
+            self._finalizar_turno(turno, texto)
+        traza.terminar(turno.uso_propio(uso), cacheada=turno.respuesta_cacheada is not None)
+        return Respuesta(turno.chat_id, texto, uso, cacheada=turno.respuesta_cacheada is not None)
+
+    def generar_respuesta_stream(self, prompt: str, chat_id: Optional[int] = None,
+                                 user_id: Optional[int] = None) -> RespuestaStream:
+        """
+        Igual que generar_respuesta, pero el resultado se recorre por fragmentos de
+        texto a medida que el modelo los produce; `chat_id` está disponible desde antes
+        del primer fragmento. La respuesta completa se guarda una sola vez al terminar.
+        """
+        traza = Traza(self.metricas, "stream", user_id, chat_id)
+        with traza.registrar_errores():
+            turno = self._preparar_turno(prompt, chat_id, user_id, traza)
+        return RespuestaStream(turno.chat_id, self._partes_stream(turno),
+                               cacheada=turno.respuesta_cacheada is not None)
+
+    def evaluar_pdf(self, pdf_path: pathlib.Path, prompt: str, chat_id: Optional[int] = None,
+                    user_id: Optional[int] = None) -> Respuesta:
+        traza = Traza(self.metricas, "pdf", user_id, chat_id)
+        with traza.registrar_errores():
+            turno = self._preparar_pdf(pdf_path, prompt, chat_id, user_id, traza)
+
+            with traza.etapa("modelo"):
+                texto, uso = self._llamar_modelo(turno)
+
+            self._finalizar_turno(turno, texto)
+        traza.terminar(turno.uso_propio(uso))
+        return Respuesta(turno.chat_id, texto, uso)
+
+    # Variantes asíncronas: la llamada al modelo usa el cliente nativo de asyncio
+    # (client.aio) y el trabajo con SQLite corre en un hilo con asyncio.to_thread,
+    # así una respuesta lenta no bloquea el bucle de eventos de Flet.
+
+    async def generar_respuesta_async(self, prompt: str, chat_id: Optional[int] = None,
+                                      user_id: Optional[int] = None) -> Respuesta:
+        traza = Traza(self.metricas, "respuesta", user_id, chat_id)
+        with traza.registrar_errores():
+            turno = await asyncio.to_thread(self._preparar_turno, prompt, chat_id, user_id, traza)
+            if turno.respuesta_cacheada is not None:
+                texto, uso = turno.respuesta_cacheada, None
+            else:
+                with traza.etapa("modelo"):
+                    texto, uso = await self._llamar_modelo_async(turno)
+
+            await asyncio.to_thread(self._finalizar_turno, turno, texto)
+        traza.terminar(turno.uso_propio(uso), cacheada=turno.respuesta_cacheada is not None)
+        return Respuesta(turno.chat_id, texto, uso, cacheada=turno.respuesta_cacheada is not None)
+
+    async def generar_respuesta_stream_async(self, prompt: str, chat_id: Optional[int] = None,
+                                             user_id: Optional[int] = None) -> RespuestaStreamAsync:
+        traza = Traza(self.metricas, "stream", user_id, chat_id)
+        with traza.registrar_errores():
+            turno = await asyncio.to_thread(self._preparar_turno, prompt, chat_id, user_id, traza)
+        return RespuestaStreamAsync(turno.chat_id, self._partes_stream_async(turno),
+                                    cacheada=turno.respuesta_cacheada is not None)
+
+    async def evaluar_pdf_async(self, pdf_path: pathlib.Path, prompt: str, chat_id: Optional[int] = None,
+                                user_id: Optional[int] = None) -> Respuesta:
+        traza = Traza(self.metricas, "pdf", user_id, chat_id)
+        with traza.registrar_errores():
+            turno = await asyncio.to_thread(self._preparar_pdf, pdf_path, prompt, chat_id, user_id, traza)
+
+            with traza.etapa("modelo"):
+                texto, uso = await self._llamar_modelo_async(turno)
+
+            await asyncio.to_thread(self._finalizar_turno, turno, texto)
+        traza.terminar(turno.uso_propio(uso))
+        return Respuesta(turno.chat_id, texto, uso)
+
+    async def obtener_chats_usuario_async(self, user_id: int, despues_de: Optional[Tuple[str, int]] = None,
+                                          limite: Optional[int] = None) -> List[Dict]:
+        return await asyncio.to_thread(self.obtener_chats_usuario, user_id, despues_de, limite)
+
+    async def obtener_historial_chat_async(self, chat_id: int, antes_de_orden: Optional[int] = None,
+                                           limite: Optional[int] = None) -> List[Dict]:
+        return await asyncio.to_thread(self.obtener_historial_chat, chat_id, antes_de_orden, limite)
+    
+    def obtener_chats_usuario(self, user_id: int, despues_de: Optional[Tuple[str, int]] = None,
+                              limite: Optional[int] = None) -> List[Dict]:
+        """
+        Chats del usuario, del más reciente al más antiguo. Paginación por cursor:
+        `despues_de` es el (fecha_creacion, id) del último chat de la página anterior.
+        Sin `limite` devuelve todos.
+        """
+        consulta = "SELECT id, titulo, fecha_creacion FROM Chat WHERE user_id = ?"
+        params: list = [user_id]
+        if despues_de is not None:
+            consulta += " AND (fecha_creacion, id) < (?, ?)"
+            params.extend(despues_de)
+        consulta += " ORDER BY fecha_creacion DESC, id DESC"
+        if limite is not None:
+            consulta += " LIMIT ?"
+            params.append(limite)
+
+        with self.pool.conexion() as conn:
+            cursor = conn.execute(consulta, params)
             return [{"id": row[0], "titulo": row[1], "fecha_creacion": row[2]} 
                     for row in cursor.fetchall()]
-        finally:
-            conn.close() 
     
-    def obtener_historial_chat(self, chat_id: int) -> List[Dict]:
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                "SELECT role, contenido, fecha FROM Historial WHERE chat_id = ? ORDER BY orden",
-                (chat_id,)
-            )
-            return [{"role": row[0], "content": row[1], "fecha": row[2]} 
-                    for row in cursor.fetchall()]
-        finally:
-            conn.close()
+    def obtener_historial_chat(self, chat_id: int, antes_de_orden: Optional[int] = None,
+                               limite: Optional[int] = None) -> List[Dict]:
+        """
+        Mensajes del chat en orden cronológico. Con `limite` devuelve la página de los
+        `limite` mensajes más recientes anteriores a `antes_de_orden` (o los últimos si
+        es None); para la página siguiente se pasa el `orden` del primer mensaje recibido.
+        """
+        consulta = "SELECT orden, role, contenido, codec, fecha FROM Historial WHERE chat_id = ?"
+        params: list = [chat_id]
+        if antes_de_orden is not None:
+            consulta += " AND orden < ?"
+            params.append(antes_de_orden)
+        if limite is not None:
+            consulta += " ORDER BY orden DESC LIMIT ?"
+            params.append(limite)
+        else:
+            consulta += " ORDER BY orden"
+
+        self.escritor.flush()
+        rehidratar(self.pool, chat_id)
+        with self.pool.conexion() as conn:
+            filas = conn.execute(consulta, params).fetchall()
+        if limite is not None:
+            filas.reverse()
+        # Solo se descomprimen los mensajes de la página pedida.
+        return [{"orden": row[0], "role": row[1], "content": descomprimir(row[2], row[3]), "fecha": row[4]}
+                for row in filas]
     
+    def buscar_conversaciones(self, user_id: int, texto: str, limite: int = 20) -> List[Dict]:
+        """Búsqueda de texto completo en los chats del usuario, con fragmentos ordenados por relevancia."""
+        self.escritor.flush()
+        with self.pool.conexion() as conn:
+            return buscar_mensajes(conn, user_id, texto, limite)
+
+    async def buscar_conversaciones_async(self, user_id: int, texto: str, limite: int = 20) -> List[Dict]:
+        return await asyncio.to_thread(self.buscar_conversaciones, user_id, texto, limite)
+
     def limpiar_historial(self, chat_id: int):
-        conn = self._get_db_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM Historial WHERE chat_id = ?", (chat_id,))
-            cursor.execute("DELETE FROM Chat WHERE id = ?", (chat_id,))
-            conn.commit()
-            print(f"Historial y chat {chat_id} limpiados y eliminados.")
-        finally:
-            conn.close() 
+        self.escritor.flush()
+        with self.pool.transaccion() as conn:
+            conn.execute("DELETE FROM Historial WHERE chat_id = ?", (chat_id,))
+            conn.execute("DELETE FROM Resumen WHERE chat_id = ?", (chat_id,))
+            conn.execute("DELETE FROM ChatArchivado WHERE chat_id = ?", (chat_id,))
+            conn.execute("DELETE FROM Chat WHERE id = ?", (chat_id,))
+        self.historial_cache.invalidar(chat_id)
+        print(f"Historial y chat {chat_id} limpiados y eliminados.")
+
+    def archivar_chats_inactivos(self, dias: int, directorio: Optional[str] = None,
+                                 limite: Optional[int] = None) -> List[int]:
+        """
+        Mueve a segmentos JSONL comprimidos los chats sin actividad en `dias` días y
+        libera su espacio en la base. Se rehidratan solos al volver a abrirlos.
+        """
+        self.escritor.flush()
+        archivados = archivar_inactivos(self.pool, dias, directorio, limite)
+        for chat_id in archivados:
+            self.historial_cache.invalidar(chat_id)
+        return archivados
 
 
 if __name__ == "__main__":
     print("Iniciando pruebas de la clase Gemini...")
 
-    initial_conn = sqlite3.connect('tesisIA.db')
-    setup_database(initial_conn)
-    initial_conn.close() 
+    init_storage()
     print("Base de datos configurada.")
 
     gemini_instance = Gemini()
@@ -216,15 +679,15 @@ if __name__ == "__main__":
     pregunta_inicial = "Necesito ayuda con el planteamiento del problema de mi tesis."
     print(f"Usuario ({test_user_id}): {pregunta_inicial}")
     respuesta_inicial = gemini_instance.generar_respuesta(pregunta_inicial, user_id=test_user_id)
-    print(f"Gemini: {respuesta_inicial}")
-    current_test_chat_id = gemini_instance.current_chat_id
+    print(f"Gemini: {respuesta_inicial.texto}")
+    current_test_chat_id = respuesta_inicial.chat_id
     print(f"ID del chat actual: {current_test_chat_id}")
 
     print("\n--- Ejemplo: Continuar el mismo chat ---")
     pregunta_seguimiento = "¿Y qué hay de los agujeros negros?"
     print(f"Usuario ({test_user_id}): {pregunta_seguimiento}")
     respuesta_seguimiento = gemini_instance.generar_respuesta(pregunta_seguimiento, chat_id=current_test_chat_id)
-    print(f"Gemini: {respuesta_seguimiento}")
+    print(f"Gemini: {respuesta_seguimiento.texto}")
 
     print("\n--- Ejemplo: Chats del usuario ---")
     chats_del_usuario = gemini_instance.obtener_chats_usuario(test_user_id)
@@ -0,0 +1,51 @@
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from backend.models.contexto import HistorialChat, Mensaje
+
+
+class HistorialCache:
+    """
+    Caché LRU acotada del historial ya convertido a `types.Content`, por chat_id.
+    Los turnos nuevos se agregan al final del historial en memoria (la escritura en
+    Historial la hace quien llama), así un turno no relee ni reconstruye toda la
+    conversación. Es thread-safe y puede compartirse entre instancias de Gemini.
+    """
+
+    def __init__(self, max_chats: int = 256):
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, HistorialChat]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, chat_id: int) -> Optional[HistorialChat]:
+        """Devuelve el historial cacheado o None si el chat no está cargado."""
+        with self._lock:
+            historial = self._chats.get(chat_id)
+            if historial is not None:
+                self._chats.move_to_end(chat_id)
+            return historial
+
+    def guardar(self, chat_id: int, historial: HistorialChat):
+        with self._lock:
+            self._chats[chat_id] = historial
+            self._chats.move_to_end(chat_id)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+
+    def agregar(self, chat_id: int, mensaje: Mensaje):
+        """Agrega un mensaje al final si el chat está en caché; si no, no hace nada."""
+        historial = self.obtener(chat_id)
+        if historial is not None:
+            historial.agregar(mensaje)
+
+    def invalidar(self, chat_id: int):
+        with self._lock:
+            self._chats.pop(chat_id, None)
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+
+# Caché compartida por todas las instancias de Gemini del proceso.
+HISTORIAL_CACHE = HistorialCache()
@@ -0,0 +1,231 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+from google.genai import errors
+
+T = TypeVar("T")
+
+# Códigos que vale la pena reintentar: cuota agotada y errores transitorios del servidor.
+CODIGOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Cubeta de tokens con reservas: quien pide más de lo disponible deja el saldo en
+    negativo y recibe cuánto debe esperar, así las solicitudes se atienden en orden
+    de llegada sin sondeo.
+    """
+
+    def __init__(self, capacidad: float, por_segundo: float):
+        self.capacidad = capacidad
+        self.por_segundo = por_segundo
+        self._tokens = capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reservar(self, cantidad: float = 1) -> float:
+        """Descuenta `cantidad` y devuelve los segundos a esperar antes de usarla."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.por_segundo)
+            self._ultimo = ahora
+            self._tokens -= min(cantidad, self.capacidad)
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.por_segundo
+
+    def consumir(self, cantidad: float):
+        """Descuenta tokens ya usados (p. ej. los de la respuesta) sin esperar."""
+        with self._lock:
+            self._tokens -= cantidad
+
+
+def _espera_sugerida(error: errors.APIError) -> Optional[float]:
+    """Segundos sugeridos por el servidor (cabecera Retry-After o RetryInfo.retryDelay)."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        valor = headers.get("retry-after")
+        if valor:
+            try:
+                return float(valor)
+            except ValueError:
+                pass
+
+    detalles = getattr(error, "details", None) or {}
+    if isinstance(detalles, dict):
+        detalles = detalles.get("error", detalles).get("details", [])
+    for detalle in detalles if isinstance(detalles, list) else []:
+        if isinstance(detalle, dict) and "retryDelay" in detalle:
+            m = re.match(r"([\d.]+)s", str(detalle["retryDelay"]))
+            if m:
+                return float(m.group(1))
+    return None
+
+
+class LimitadorGemini:
+    """
+    Limita las llamadas al modelo a la cuota del proyecto (solicitudes y tokens por
+    minuto), acota cuántas hay en curso a la vez y reintenta los 429/5xx con espera
+    exponencial con jitter, respetando la espera que sugiera el servidor.
+    El tope de concurrencia es independiente para las llamadas síncronas (hilos) y
+    las asíncronas (bucle de eventos).
+    """
+
+    def __init__(self, rpm: int = 15, tpm: int = 1_000_000, max_concurrentes: int = 8,
+                 max_reintentos: int = 5, espera_base: float = 1.0, espera_maxima: float = 60.0):
+        self.solicitudes = TokenBucket(rpm, rpm / 60)
+        self.tokens = TokenBucket(tpm, tpm / 60)
+        self.max_concurrentes = max_concurrentes
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._semaforo = threading.BoundedSemaphore(max_concurrentes)
+        # Un semáforo por bucle de eventos; el bucle se libera al cerrarse y recolectarse.
+        self._semaforos_async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+        self._metricas = {
+            "llamadas": 0,
+            "reintentos": 0,
+            "fallidas": 0,
+            "esperas_cuota": 0,
+            "segundos_esperando_cuota": 0.0,
+            "segundos_en_backoff": 0.0,
+        }
+
+    def metricas(self) -> dict:
+        with self._lock:
+            return dict(self._metricas)
+
+    def _contar(self, clave: str, valor: float = 1):
+        with self._lock:
+            self._metricas[clave] += valor
+
+    def _espera_cuota(self, tokens: int) -> float:
+        espera = max(self.solicitudes.reservar(1), self.tokens.reservar(tokens))
+        if espera > 0:
+            self._contar("esperas_cuota")
+            self._contar("segundos_esperando_cuota", espera)
+        return espera
+
+    def _espera_reintento(self, intento: int, error: Exception) -> Optional[float]:
+        """Segundos antes del siguiente intento, o None si el error no se reintenta."""
+        if not isinstance(error, errors.APIError) or error.code not in CODIGOS_REINTENTABLES:
+            return None
+        if intento >= self.max_reintentos:
+            return None
+        espera = min(self.espera_maxima, self.espera_base * 2 ** intento) * random.uniform(0.5, 1.0)
+        sugerida = _espera_sugerida(error)
+        if sugerida is not None:
+            espera = max(espera, sugerida)
+        self._contar("reintentos")
+        self._contar("segundos_en_backoff", espera)
+        return espera
+
+    def _semaforo_async(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if loop not in self._semaforos_async:
+                self._semaforos_async[loop] = asyncio.Semaphore(self.max_concurrentes)
+            return self._semaforos_async[loop]
+
+    def registrar_uso(self, tokens_respuesta: Optional[int]):
+        if tokens_respuesta:
+            self.tokens.consumir(tokens_respuesta)
+
+    def ejecutar(self, funcion: Callable[[], T], tokens: int = 0) -> T:
+        with self._semaforo:
+            intento = 0
+            while True:
+                time.sleep(self._espera_cuota(tokens))
+                self._contar("llamadas")
+                try:
+                    return funcion()
+                except Exception as e:
+                    espera = self._espera_reintento(intento, e)
+                    if espera is None:
+                        self._contar("fallidas")
+                        raise
+                intento += 1
+                time.sleep(espera)
+
+    def stream(self, funcion: Callable[[], Iterator[T]], tokens: int = 0) -> Iterator[T]:
+        """Como `ejecutar` para streams: solo se reintenta si falla antes del primer fragmento."""
+        with self._semaforo:
+            intento = 0
+            while True:
+                time.sleep(self._espera_cuota(tokens))
+                self._contar("llamadas")
+                try:
+                    iterador = iter(funcion())
+                    primero = next(iterador)
+                except StopIteration:
+                    return
+                except Exception as e:
+                    espera = self._espera_reintento(intento, e)
+                    if espera is None:
+                        self._contar("fallidas")
+                        raise
+                    intento += 1
+                    time.sleep(espera)
+                    continue
+                yield primero
+                yield from iterador
+                return
+
+    async def ejecutar_async(self, funcion: Callable[[], Awaitable[T]], tokens: int = 0) -> T:
+        async with self._semaforo_async():
+            intento = 0
+            while True:
+                await asyncio.sleep(self._espera_cuota(tokens))
+                self._contar("llamadas")
+                try:
+                    return await funcion()
+                except Exception as e:
+                    espera = self._espera_reintento(intento, e)
+                    if espera is None:
+                        self._contar("fallidas")
+                        raise
+                intento += 1
+                await asyncio.sleep(espera)
+
+    async def stream_async(self, funcion: Callable[[], Awaitable[AsyncIterator[T]]],
+                           tokens: int = 0) -> AsyncIterator[T]:
+        async with self._semaforo_async():
+            intento = 0
+            while True:
+                await asyncio.sleep(self._espera_cuota(tokens))
+                self._contar("llamadas")
+                try:
+                    iterador = (await funcion()).__aiter__()
+                    primero = await iterador.__anext__()
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    espera = self._espera_reintento(intento, e)
+                    if espera is None:
+                        self._contar("fallidas")
+                        raise
+                    intento += 1
+                    await asyncio.sleep(espera)
+                    continue
+                yield primero
+                async for chunk in iterador:
+                    yield chunk
+                return
+
+
+# Compartido por todo el proceso; la cuota es del proyecto, no de cada sesión.
+LIMITADOR = LimitadorGemini(
+    rpm=int(os.getenv("TESISIA_RPM", "15")),
+    tpm=int(os.getenv("TESISIA_TPM", "1000000")),
+    max_concurrentes=int(os.getenv("TESISIA_MAX_CONCURRENTES", "8")),
+)
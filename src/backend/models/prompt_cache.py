@@ -0,0 +1,151 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from google.genai import errors, types
+
+from backend.models.contexto import estimar_tokens
+
+# Mínimo de tokens de entrada que cada modelo acepta para context caching explícito.
+# El prompt de Anglai (~720 tokens estimados) no alcanza el de gemini-2.0-flash: hoy
+# se envía inline y la caché se activa sola si el prompt crece o se cambia de modelo.
+TOKENS_MINIMOS = {
+    "gemini-2.0-flash": 4096,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 2048,
+}
+TOKENS_MINIMOS_POR_DEFECTO = 4096
+
+
+class CachePrompt:
+    """
+    Administra el contenido cacheado en el servidor (context caching) con las
+    instrucciones de sistema. Lo crea una vez, extiende su TTL cuando pasa la mitad
+    de su vida y lo vuelve a crear si expiró. Si el prompt es muy corto para
+    cachearse o la creación falla, las instrucciones se envían como
+    `system_instruction` en cada solicitud. Si una solicitud falla porque el servidor
+    ya no tiene la caché, quien llama la descarta con `invalidar` y repite con
+    `config_inline`.
+    """
+
+    def __init__(self, client, modelo: str, system_instruction: str,
+                 ttl_segundos: int = 3600, tokens_minimos: Optional[int] = None):
+        self.client = client
+        self.modelo = modelo
+        self.system_instruction = system_instruction
+        self.ttl_segundos = ttl_segundos
+        if tokens_minimos is None:
+            tokens_minimos = TOKENS_MINIMOS.get(modelo, TOKENS_MINIMOS_POR_DEFECTO)
+        self.tokens_minimos = tokens_minimos
+        self._nombre: Optional[str] = None
+        self._expira = 0.0
+        self._reintentar_en = 0.0
+        # Hay una creación o un refresco en curso; los demás no esperan la red.
+        self._ocupada = False
+        self._lock = threading.Lock()
+
+    def config(self, **kwargs) -> types.GenerateContentConfig:
+        """Configuración de generación que usa la caché si está disponible."""
+        nombre = self.obtener()
+        if nombre:
+            return types.GenerateContentConfig(cached_content=nombre, **kwargs)
+        return self.config_inline(**kwargs)
+
+    def config_inline(self, **kwargs) -> types.GenerateContentConfig:
+        """Configuración con las instrucciones en la solicitud, sin caché."""
+        return types.GenerateContentConfig(system_instruction=self.system_instruction, **kwargs)
+
+    @staticmethod
+    def es_cache_vencida(config: Optional[types.GenerateContentConfig], error: errors.APIError) -> bool:
+        """True si la solicitud usaba una caché y falló porque el servidor ya no la tiene."""
+        if config is None or not config.cached_content:
+            return False
+        return error.code in (400, 403, 404) and "cache" in (error.message or "").lower()
+
+    def obtener(self) -> Optional[str]:
+        """
+        Nombre del contenido cacheado vigente, o None si se debe enviar el prompt inline.
+        Las llamadas a la API se hacen fuera del lock: mientras un hilo crea o refresca
+        la caché, los demás usan la vigente (o el prompt inline) sin bloquearse.
+        """
+        if estimar_tokens(self.system_instruction) < self.tokens_minimos:
+            return None
+
+        with self._lock:
+            ahora = time.monotonic()
+            vigente = self._nombre if self._nombre and ahora < self._expira else None
+            if self._ocupada:
+                return vigente
+            if vigente:
+                if self._expira - ahora >= self.ttl_segundos / 2:
+                    return vigente
+            elif ahora < self._reintentar_en:
+                return None
+            self._ocupada = True
+
+        try:
+            if vigente:
+                self._refrescar(vigente, ahora)
+            else:
+                self._crear(ahora)
+        finally:
+            with self._lock:
+                self._ocupada = False
+        with self._lock:
+            return self._nombre if self._nombre and time.monotonic() < self._expira else None
+
+    def invalidar(self, nombre: Optional[str] = None):
+        """
+        Olvida la caché actual (p. ej. si el servidor respondió que ya no existe). Con
+        `nombre`, solo si sigue siendo esa: otro hilo pudo haberla recreado ya.
+        """
+        with self._lock:
+            if nombre is not None and nombre != self._nombre:
+                return
+            self._nombre = None
+            self._expira = 0.0
+
+    def _crear(self, ahora: float):
+        try:
+            cache = self.client.caches.create(
+                model=self.modelo,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=self.system_instruction,
+                    ttl=f"{self.ttl_segundos}s",
+                ),
+            )
+        except errors.APIError as e:
+            print("No se pudo crear la caché del prompt, se enviará inline:", e)
+            with self._lock:
+                self._nombre = None
+                self._reintentar_en = ahora + self.ttl_segundos
+            return
+        with self._lock:
+            self._nombre = cache.name
+            self._expira = ahora + self.ttl_segundos
+
+    def _refrescar(self, nombre: str, ahora: float):
+        try:
+            self.client.caches.update(
+                name=nombre,
+                config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_segundos}s"),
+            )
+        except errors.APIError:
+            # Expiró o fue borrada en el servidor: se recrea.
+            self._crear(ahora)
+            return
+        with self._lock:
+            self._expira = ahora + self.ttl_segundos
+
+
+_caches: Dict[Tuple[str, str], CachePrompt] = {}
+_caches_lock = threading.Lock()
+
+
+def cache_compartida(client, modelo: str, system_instruction: str) -> CachePrompt:
+    """Una sola CachePrompt por modelo y prompt en todo el proceso."""
+    with _caches_lock:
+        clave = (modelo, system_instruction)
+        if clave not in _caches:
+            _caches[clave] = CachePrompt(client, modelo, system_instruction)
+        return _caches[clave]
@@ -0,0 +1,161 @@
+import atexit
+import hashlib
+import queue
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from google.genai import types
+
+from database.escritura import ESPERA_AL_SALIR, consumir_en_lotes
+from database.storage import get_pool
+
+
+def _normalizar(texto: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", texto).split())
+
+
+class RespuestaCache:
+    """
+    Caché de respuestas por coincidencia exacta. La clave es un SHA-256 del modelo,
+    las instrucciones de sistema y el contenido enviado (texto normalizado en Unicode
+    y espacios). Vive en memoria con desalojo LRU y TTL y, opcionalmente, en la tabla
+    RespuestaCache para sobrevivir reinicios. Lleva contadores de aciertos y fallos.
+    La tabla se escribe en segundo plano, en lotes, para no sumar un commit a la respuesta.
+    """
+
+    def __init__(self, max_entradas: int = 512, ttl_segundos: int = 24 * 3600,
+                 persistente: bool = True, max_persistidas: int = 10000):
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.persistente = persistente
+        self.max_persistidas = max_persistidas
+        self.aciertos = 0
+        self.fallos = 0
+        self._memoria: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        # Escritor de la tabla; el hilo arranca con la primera respuesta a persistir.
+        self._cola: "queue.Queue[Optional[Tuple[str, str, float]]]" = queue.Queue()
+        self._hilo: Optional[threading.Thread] = None
+
+    @staticmethod
+    def clave(modelo: str, system_instruction: str, contents: List[types.Content]) -> Optional[str]:
+        """Clave de la solicitud, o None si no es cacheable (p. ej. lleva adjuntos)."""
+        h = hashlib.sha256()
+        h.update(modelo.encode())
+        h.update(b"\0")
+        h.update(_normalizar(system_instruction).encode())
+        for content in contents:
+            for part in content.parts:
+                if part.text is None:
+                    return None
+                h.update(b"\0" + content.role.encode() + b"\0")
+                h.update(_normalizar(part.text).encode())
+        return h.hexdigest()
+
+    def obtener(self, clave: Optional[str]) -> Optional[str]:
+        if clave is None:
+            return None
+        ahora = time.time()
+        with self._lock:
+            entrada = self._memoria.get(clave)
+            if entrada is not None and ahora - entrada[1] < self.ttl_segundos:
+                self._memoria.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[0]
+            self._memoria.pop(clave, None)
+
+        texto = self._obtener_persistida(clave, ahora) if self.persistente else None
+        with self._lock:
+            if texto is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+        return texto
+
+    def guardar(self, clave: Optional[str], texto: str, creado: Optional[float] = None):
+        if clave is None or not texto:
+            return
+        creado = creado or time.time()
+        with self._lock:
+            self._guardar_en_memoria(clave, texto, creado)
+        if self.persistente:
+            self._persistir(clave, texto, creado)
+
+    def cerrar(self, timeout: Optional[float] = None):
+        """Guarda en la tabla lo pendiente y detiene el hilo escritor."""
+        if self._hilo is not None and self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / total if total else 0.0,
+                "entradas_memoria": len(self._memoria),
+            }
+
+    def _guardar_en_memoria(self, clave: str, texto: str, creado: float):
+        self._memoria[clave] = (texto, creado)
+        self._memoria.move_to_end(clave)
+        while len(self._memoria) > self.max_entradas:
+            self._memoria.popitem(last=False)
+
+    def _obtener_persistida(self, clave: str, ahora: float) -> Optional[str]:
+        with get_pool().conexion() as conn:
+            fila = conn.execute(
+                "SELECT respuesta, creado FROM RespuestaCache WHERE clave = ? AND creado > ?",
+                (clave, ahora - self.ttl_segundos)
+            ).fetchone()
+        if fila is None:
+            return None
+        with self._lock:
+            self._guardar_en_memoria(clave, fila[0], fila[1])
+        return fila[0]
+
+    def _persistir(self, clave: str, texto: str, creado: float):
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(
+                    target=consumir_en_lotes, args=(self._cola, 256, self._escribir),
+                    name="respuesta-cache", daemon=True
+                )
+                self._hilo.start()
+                atexit.register(self.cerrar, ESPERA_AL_SALIR)
+        self._cola.put((clave, texto, creado))
+
+    def _escribir(self, lote: List[Tuple[str, str, float]]):
+        with self._lock:
+            antes = self._escrituras
+            self._escrituras += len(lote)
+            # Poda cada 100 escrituras: expiradas y, si sobran, las más antiguas.
+            podar = antes // 100 != self._escrituras // 100
+        try:
+            with get_pool().transaccion() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO RespuestaCache (clave, respuesta, creado) VALUES (?, ?, ?)",
+                    lote
+                )
+                if podar:
+                    conn.execute(
+                        "DELETE FROM RespuestaCache WHERE creado <= ?",
+                        (time.time() - self.ttl_segundos,)
+                    )
+                    conn.execute(
+                        "DELETE FROM RespuestaCache WHERE clave IN ("
+                        "SELECT clave FROM RespuestaCache ORDER BY creado DESC LIMIT -1 OFFSET ?)",
+                        (self.max_persistidas,)
+                    )
+        except Exception as e:
+            # Es una caché: perder estas entradas en la tabla no afecta a la aplicación.
+            print(f"No se pudieron guardar {len(lote)} respuestas en la caché: {e}")
+
+
+# Caché compartida por todas las instancias de Gemini del proceso.
+RESPUESTA_CACHE = RespuestaCache()
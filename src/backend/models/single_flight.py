@@ -0,0 +1,296 @@
+import asyncio
+import hashlib
+import threading
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from google.genai import types
+
+T = TypeVar("T")
+
+
+def huella(modelo: str, system_instruction: str, contents: List[types.Content]) -> str:
+    """Huella de una solicitud al modelo: texto de cada parte y URI de los archivos adjuntos."""
+    h = hashlib.sha256()
+    h.update(modelo.encode() + b"\0" + system_instruction.encode())
+    for content in contents:
+        h.update(b"\0" + content.role.encode())
+        for part in content.parts:
+            if part.text is not None:
+                h.update(b"\0t" + part.text.encode())
+            elif part.file_data is not None:
+                h.update(b"\0f" + part.file_data.file_uri.encode())
+    return h.hexdigest()
+
+
+def _error_para_seguidores(e: BaseException) -> BaseException:
+    """Si la llamada compartida fue cancelada, los lectores reciben un error normal."""
+    if isinstance(e, Exception):
+        return e
+    return RuntimeError("La solicitud compartida se interrumpió antes de terminar")
+
+
+class _Vuelo:
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.error: Optional[BaseException] = None
+
+
+class _Difusion:
+    """
+    Fragmentos de un stream en curso, que cualquier número de lectores puede recorrer.
+    Si todos los lectores lo abandonan antes del final, queda `abandonada` y quien
+    produce los fragmentos deja de pedirlos.
+    """
+
+    def __init__(self):
+        self.chunks: list = []
+        self.terminado = False
+        self.abandonada = False
+        self.error: Optional[BaseException] = None
+        self.lectores = 0
+        self.condicion = threading.Condition()
+
+    def unirse(self) -> bool:
+        with self.condicion:
+            if self.abandonada:
+                return False
+            self.lectores += 1
+            return True
+
+    def salir(self):
+        with self.condicion:
+            self.lectores -= 1
+            if self.lectores == 0 and not self.terminado:
+                self.abandonada = True
+
+    def publicar(self, chunk):
+        with self.condicion:
+            self.chunks.append(chunk)
+            self.condicion.notify_all()
+
+    def cerrar(self, error: Optional[BaseException] = None):
+        with self.condicion:
+            self.terminado = True
+            self.error = error
+            self.condicion.notify_all()
+
+    def leer(self) -> Iterator:
+        """Recorre los fragmentos; al terminar o abandonar la lectura, sale de la difusión."""
+        i = 0
+        try:
+            while True:
+                with self.condicion:
+                    while i >= len(self.chunks) and not self.terminado:
+                        self.condicion.wait()
+                    pendientes = self.chunks[i:]
+                    terminado, error = self.terminado, self.error
+                yield from pendientes
+                i += len(pendientes)
+                if terminado and i >= len(self.chunks):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            self.salir()
+
+
+class _VueloAsync:
+    def __init__(self, tarea: "asyncio.Task"):
+        self.tarea = tarea
+        self.esperando = 0
+
+
+class _DifusionAsync:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.chunks: list = []
+        self.terminado = False
+        self.abandonada = False
+        self.error: Optional[BaseException] = None
+        self.lectores = 0
+        self.tarea: Optional["asyncio.Task"] = None
+        self._nuevo = asyncio.Event()
+
+    def publicar(self, chunk):
+        self.chunks.append(chunk)
+        self._nuevo.set()
+
+    def cerrar(self, error: Optional[BaseException] = None):
+        self.terminado = True
+        self.error = error
+        self._nuevo.set()
+
+    async def leer(self) -> AsyncIterator:
+        self.lectores += 1
+        i = 0
+        try:
+            while True:
+                while i < len(self.chunks):
+                    yield self.chunks[i]
+                    i += 1
+                if self.terminado:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                self._nuevo.clear()
+                await self._nuevo.wait()
+        finally:
+            self.lectores -= 1
+            # Nadie más lee: se deja de pedir fragmentos al modelo.
+            if self.lectores == 0 and not self.terminado and self.tarea is not None:
+                self.abandonada = True
+                self.tarea.cancel()
+
+
+class SingleFlight:
+    """
+    Agrupa las solicitudes idénticas que están en curso al mismo tiempo: la primera
+    inicia la llamada al modelo y todas, incluida ella, esperan y reciben el mismo
+    resultado (o los mismos fragmentos, en streaming). La llamada corre en un hilo o
+    tarea propia del vuelo, no en quien la inició: si ese solicitante se cancela o
+    abandona el stream, los demás siguen recibiendo la respuesta. Solo se detiene
+    cuando ya no queda nadie esperando. Con clave None la llamada se hace sin agrupar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vuelos: Dict[str, _Vuelo] = {}
+        self._difusiones: Dict[str, _Difusion] = {}
+        self._vuelos_async: Dict[str, _VueloAsync] = {}
+        self._difusiones_async: Dict[str, _DifusionAsync] = {}
+        self.agrupadas = 0
+
+    def hacer(self, clave: Optional[str], funcion: Callable[[], T]) -> T:
+        if clave is None:
+            return funcion()
+        with self._lock:
+            vuelo = self._vuelos.get(clave)
+            if vuelo is None:
+                vuelo = self._vuelos[clave] = _Vuelo()
+                threading.Thread(target=self._volar, args=(clave, vuelo, funcion),
+                                 name="single-flight", daemon=True).start()
+            else:
+                self.agrupadas += 1
+
+        vuelo.evento.wait()
+        if vuelo.error is not None:
+            raise vuelo.error
+        return vuelo.resultado
+
+    def _volar(self, clave: str, vuelo: _Vuelo, funcion: Callable[[], T]):
+        try:
+            vuelo.resultado = funcion()
+        except BaseException as e:
+            vuelo.error = _error_para_seguidores(e)
+        finally:
+            with self._lock:
+                del self._vuelos[clave]
+            vuelo.evento.set()
+
+    def stream(self, clave: Optional[str], funcion: Callable[[], Iterator[T]]) -> Iterator[T]:
+        if clave is None:
+            yield from funcion()
+            return
+        with self._lock:
+            difusion = self._difusiones.get(clave)
+            if difusion is not None and difusion.unirse():
+                self.agrupadas += 1
+            else:
+                difusion = self._difusiones[clave] = _Difusion()
+                difusion.unirse()
+                threading.Thread(target=self._difundir, args=(clave, difusion, funcion),
+                                 name="single-flight-stream", daemon=True).start()
+
+        yield from difusion.leer()
+
+    def _difundir(self, clave: str, difusion: _Difusion, funcion: Callable[[], Iterator[T]]):
+        error = None
+        iterador = None
+        try:
+            iterador = iter(funcion())
+            for chunk in iterador:
+                difusion.publicar(chunk)
+                if difusion.abandonada:
+                    break
+        except BaseException as e:
+            error = _error_para_seguidores(e)
+        finally:
+            if iterador is not None and hasattr(iterador, "close"):
+                iterador.close()
+            with self._lock:
+                if self._difusiones.get(clave) is difusion:
+                    del self._difusiones[clave]
+            difusion.cerrar(error)
+
+    async def hacer_async(self, clave: Optional[str], funcion: Callable[[], Awaitable[T]]) -> T:
+        if clave is None:
+            return await funcion()
+        vuelo = self._vuelos_async.get(clave)
+        if vuelo is not None and vuelo.tarea.get_loop() is asyncio.get_running_loop():
+            self.agrupadas += 1
+        else:
+            vuelo = self._vuelos_async[clave] = _VueloAsync(asyncio.ensure_future(funcion()))
+            vuelo.tarea.add_done_callback(lambda tarea: self._aterrizar(clave, vuelo))
+
+        vuelo.esperando += 1
+        try:
+            # shield: cancelar a un solicitante no cancela la llamada compartida.
+            return await asyncio.shield(vuelo.tarea)
+        except asyncio.CancelledError:
+            if vuelo.tarea.cancelled():
+                raise _error_para_seguidores(asyncio.CancelledError())
+            raise
+        finally:
+            vuelo.esperando -= 1
+            if vuelo.esperando == 0 and not vuelo.tarea.done():
+                vuelo.tarea.cancel()
+
+    def _aterrizar(self, clave: str, vuelo: _VueloAsync):
+        if self._vuelos_async.get(clave) is vuelo:
+            del self._vuelos_async[clave]
+        # Evita el aviso de excepción no recuperada si nadie la esperaba.
+        if not vuelo.tarea.cancelled():
+            vuelo.tarea.exception()
+
+    async def stream_async(self, clave: Optional[str],
+                           funcion: Callable[[], Awaitable[AsyncIterator[T]]]) -> AsyncIterator[T]:
+        if clave is None:
+            async for chunk in await funcion():
+                yield chunk
+            return
+        difusion = self._difusiones_async.get(clave)
+        if difusion is not None and difusion.loop is asyncio.get_running_loop() and not difusion.abandonada:
+            self.agrupadas += 1
+        else:
+            difusion = self._difusiones_async[clave] = _DifusionAsync()
+            difusion.tarea = asyncio.ensure_future(self._difundir_async(clave, difusion, funcion))
+
+        lector = difusion.leer()
+        try:
+            async for chunk in lector:
+                yield chunk
+        finally:
+            # Cierra la lectura ya, no cuando la recoja el recolector: así cuenta como abandonada.
+            await lector.aclose()
+
+    async def _difundir_async(self, clave: str, difusion: _DifusionAsync,
+                              funcion: Callable[[], Awaitable[AsyncIterator[T]]]):
+        error = None
+        iterador = None
+        try:
+            iterador = await funcion()
+            async for chunk in iterador:
+                difusion.publicar(chunk)
+        except BaseException as e:
+            error = _error_para_seguidores(e)
+        finally:
+            if self._difusiones_async.get(clave) is difusion:
+                del self._difusiones_async[clave]
+            difusion.cerrar(error)
+            if iterador is not None and hasattr(iterador, "aclose"):
+                await iterador.aclose()
+
+
+# Compartido por todas las instancias de Gemini del proceso.
+SINGLE_FLIGHT = SingleFlight()
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from database.metricas import RegistroMetricas, RegistroSolicitud
+
+
+class Traza:
+    """
+    Tiempos de una solicitud al modelo, por etapa: guardar el prompt, cargar el
+    historial, armar el contexto, llamar al modelo, primer token, persistir la
+    respuesta... Viaja con el turno y se registra una sola vez al terminar, con el
+    uso de tokens de la respuesta, aunque la solicitud falle o el stream se corte.
+    """
+
+    def __init__(self, registro: Optional[RegistroMetricas], operacion: str,
+                 user_id: Optional[int] = None, chat_id: Optional[int] = None):
+        self.registro = registro
+        self.operacion = operacion
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.etapas: Dict[str, float] = {}
+        self._inicio = time.perf_counter()
+        self._terminada = False
+
+    @contextmanager
+    def etapa(self, nombre: str) -> Iterator[None]:
+        """Suma al `nombre` el tiempo del bloque (si se repite, se acumula)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + (time.perf_counter() - inicio) * 1000
+
+    def marcar(self, nombre: str):
+        """Registra `nombre` como los ms transcurridos desde el inicio (p. ej. el primer token)."""
+        self.etapas.setdefault(nombre, (time.perf_counter() - self._inicio) * 1000)
+
+    @contextmanager
+    def registrar_errores(self) -> Iterator["Traza"]:
+        """Si el bloque falla (o el stream se abandona), registra la traza con el error."""
+        try:
+            yield self
+        except BaseException as e:
+            self.terminar(error=e)
+            raise
+
+    def terminar(self, uso=None, cacheada: bool = False, error: Optional[BaseException] = None):
+        """Envía la medición al registro. Las llamadas siguientes no hacen nada."""
+        if self._terminada:
+            return
+        self._terminada = True
+        if self.registro is None:
+            return
+        self.registro.registrar(RegistroSolicitud(
+            operacion=self.operacion,
+            total_ms=(time.perf_counter() - self._inicio) * 1000,
+            etapas=self.etapas,
+            user_id=self.user_id,
+            chat_id=self.chat_id,
+            cacheada=cacheada,
+            error=_nombre_error(error),
+            tokens_prompt=getattr(uso, "prompt_token_count", None),
+            tokens_respuesta=getattr(uso, "candidates_token_count", None),
+            tokens_cache=getattr(uso, "cached_content_token_count", None),
+        ))
+
+
+def _nombre_error(error: Optional[BaseException]) -> Optional[str]:
+    if error is None:
+        return None
+    if isinstance(error, (GeneratorExit, asyncio.CancelledError)):
+        return "cancelada"
+    return type(error).__name__
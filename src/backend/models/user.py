@@ -1,39 +1,35 @@
 import sqlite3
+from typing import Optional
+
+from database.storage import ConnectionPool, get_pool
 
 class User:
-    def __init__(self, db_path="tesisIA.db"):
-        self.db_path = db_path
+    def __init__(self, pool: Optional[ConnectionPool] = None):
+        self.pool = pool or get_pool()
 
     def login(self, username: str, password: str) -> bool:
         """Verifica si el usuario y password existe en la base de datos."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT 1 FROM User WHERE usuario = ? AND password = ?",
-            (username, password))
-        
-        result = cursor.fetchone()
+        with self.pool.conexion() as conn:
+            cursor = conn.execute(
+                "SELECT 1 FROM User WHERE usuario = ? AND password = ?",
+                (username, password))
+            
+            result = cursor.fetchone()
 
-        conn.close()
         return result is not None
 
     def register(self, correo: str, password: str, nombre: str, usuario: str) -> bool:
         """Inserta un nuevo usuario en la tabla User. Devuelve True si lo logró, False si hubo error (e.g. correo duplicado)."""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute(
-                "INSERT INTO User (correo, password, nombre, usuario) VALUES (?, ?, ?, ?)",
-                (correo, password, nombre, usuario)
-            )
-            conn.commit()
-            conn.close()
+            with self.pool.transaccion() as conn:
+                conn.execute(
+                    "INSERT INTO User (correo, password, nombre, usuario) VALUES (?, ?, ?, ?)",
+                    (correo, password, nombre, usuario)
+                )
             return True
         except sqlite3.IntegrityError:
             # Si tienes restricciones de unicidad y se viola alguna
             return False
         except Exception as e:
             print("Error al registrar usuario:", e)
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,121 @@
+"""
+Benchmark de la compresión de Historial.contenido.
+
+Crea una base temporal por códec (sin compresión, zlib y, si está instalado, zstd),
+escribe los mismos mensajes sintéticos largos (respuestas tipo APA) y reporta el
+tamaño final de la base y el rendimiento de escritura y lectura.
+
+Uso:
+    python benchmark_compresion.py --mensajes 5000 --chats 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from database import codec
+from database.escritura import insertar_mensaje
+from database.setup_database import setup_database
+from database.storage import ConnectionPool
+
+_PALABRAS = (
+    "investigación análisis metodología población muestra instrumento validez confiabilidad "
+    "objetivo general específico planteamiento problema antecedentes justificación variable "
+    "teórico conceptual enfoque cuantitativo cualitativo diseño campo descriptivo documental "
+    "Venezuela Bolívar universidad estudiantes docentes proceso desarrollo implementación "
+    "sistema propuesta resultados conclusiones recomendaciones según el autor establece que"
+).split()
+
+
+def _mensaje(rng: random.Random, palabras: int) -> str:
+    parrafos = []
+    while palabras > 0:
+        n = min(palabras, rng.randint(60, 120))
+        texto = " ".join(rng.choice(_PALABRAS) for _ in range(n))
+        autor = rng.choice(["Hernández et al.", "Arias", "Tamayo", "Balestrini", "Sabino"])
+        parrafos.append(f"- {texto.capitalize()} ({autor}, {rng.randint(1995, 2024)}).")
+        palabras -= n
+    return "\n\n".join(parrafos)
+
+
+def medir(nombre: str, mensajes: List[str], chats: int, directorio: str) -> Dict:
+    # comprimir() lee el códec del entorno en cada mensaje.
+    os.environ["TESISIA_CODEC"] = nombre
+    ruta = os.path.join(directorio, f"{nombre}.db")
+    pool = ConnectionPool(ruta)
+    with pool.conexion() as conn:
+        setup_database(conn)
+    with pool.transaccion() as conn:
+        conn.executemany("INSERT INTO Chat (user_id, titulo) VALUES (1, ?)",
+                         [(f"chat {i}",) for i in range(chats)])
+        ids = [fila[0] for fila in conn.execute("SELECT id FROM Chat ORDER BY id")]
+
+    inicio = time.perf_counter()
+    for i in range(0, len(mensajes), 50):
+        with pool.transaccion() as conn:
+            for j, texto in enumerate(mensajes[i:i + 50], i):
+                insertar_mensaje(conn, ids[j % chats], "model" if j % 2 else "user", texto)
+    escritura = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    leidos = 0
+    with pool.conexion() as conn:
+        for chat_id in ids:
+            for contenido, c in conn.execute(
+                "SELECT contenido, codec FROM Historial WHERE chat_id = ? ORDER BY orden", (chat_id,)
+            ):
+                leidos += len(codec.descomprimir(contenido, c))
+    lectura = time.perf_counter() - inicio
+
+    with pool.conexion() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        comprimidos = conn.execute("SELECT COUNT(*) FROM Historial WHERE codec != 0").fetchone()[0]
+    pool.cerrar()
+
+    megas = sum(len(m.encode("utf-8")) for m in mensajes) / 1e6
+    return {
+        "codec": nombre,
+        "tamano_mb": os.path.getsize(ruta) / 1e6,
+        "comprimidos": comprimidos,
+        "escritura_msg_s": len(mensajes) / escritura,
+        "escritura_mb_s": megas / escritura,
+        "lectura_msg_s": len(mensajes) / lectura,
+        "lectura_mb_s": leidos / 1e6 / lectura,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compara tamaño y rendimiento con y sin compresión.")
+    parser.add_argument("--mensajes", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--palabras", type=int, default=700, help="Palabras promedio por mensaje")
+    parser.add_argument("--semilla", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.semilla)
+    mensajes = [_mensaje(rng, rng.randint(args.palabras // 2, args.palabras * 3 // 2))
+                for _ in range(args.mensajes)]
+
+    codecs = ["ninguno", "zlib"]
+    if codec.zstandard is not None:
+        codecs.append("zstd")
+
+    with tempfile.TemporaryDirectory() as directorio:
+        resultados = [medir(n, mensajes, args.chats, directorio) for n in codecs]
+
+    print(f"\n{args.mensajes} mensajes en {args.chats} chats (umbral {codec.umbral_configurado()} bytes)")
+    print(f"{'códec':<8} {'tamaño MB':>10} {'comprim.':>9} {'esc. msg/s':>11} {'esc. MB/s':>10} "
+          f"{'lect. msg/s':>12} {'lect. MB/s':>11}")
+    base = resultados[0]["tamano_mb"]
+    for r in resultados:
+        print(f"{r['codec']:<8} {r['tamano_mb']:>10.2f} {r['comprimidos']:>9} {r['escritura_msg_s']:>11.0f} "
+              f"{r['escritura_mb_s']:>10.1f} {r['lectura_msg_s']:>12.0f} {r['lectura_mb_s']:>11.1f}"
+              f"   ({r['tamano_mb'] / base:.0%} del tamaño sin comprimir)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
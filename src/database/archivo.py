@@ -0,0 +1,216 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from database.codec import comprimir, descomprimir
+from database.storage import ConnectionPool
+
+# Al superar este tamaño, los chats siguientes del usuario van a un segmento nuevo.
+TAMANO_SEGMENTO = 64 * 1024 * 1024
+
+_lock_segmentos = threading.Lock()
+
+
+def directorio_archivo() -> str:
+    """Directorio de los segmentos (TESISIA_ARCHIVO), leído al usarlo: el .env se carga después."""
+    return os.getenv("TESISIA_ARCHIVO", "archivo")
+
+
+def chats_inactivos(conn: sqlite3.Connection, dias: int, limite: Optional[int] = None) -> List[Tuple[int, int]]:
+    """(chat_id, user_id) de los chats sin mensajes nuevos en los últimos `dias` días."""
+    consulta = """
+        SELECT c.id, c.user_id
+        FROM Chat AS c
+        WHERE c.id NOT IN (SELECT chat_id FROM ChatArchivado)
+          AND EXISTS (SELECT 1 FROM Historial WHERE chat_id = c.id)
+          AND COALESCE((SELECT MAX(fecha) FROM Historial WHERE chat_id = c.id), c.fecha_creacion)
+              < datetime('now', ?)
+        ORDER BY c.id
+    """
+    params: list = [f"-{dias} days"]
+    if limite is not None:
+        consulta += " LIMIT ?"
+        params.append(limite)
+    return conn.execute(consulta, params).fetchall()
+
+
+def _segmento(directorio: str, user_id: int) -> str:
+    """Segmento vigente del usuario: el último, o uno nuevo si ya está lleno."""
+    carpeta = os.path.join(directorio, str(user_id))
+    os.makedirs(carpeta, exist_ok=True)
+    existentes = sorted(n for n in os.listdir(carpeta) if n.endswith(".jsonl.gz"))
+    if existentes:
+        ultimo = os.path.join(carpeta, existentes[-1])
+        if os.path.getsize(ultimo) < TAMANO_SEGMENTO:
+            return ultimo
+    return os.path.join(carpeta, f"segmento-{len(existentes) + 1:04d}.jsonl.gz")
+
+
+def _registro(conn: sqlite3.Connection, chat_id: int) -> Dict:
+    chat = conn.execute(
+        "SELECT id, user_id, titulo, fecha_creacion, ultimo_orden FROM Chat WHERE id = ?", (chat_id,)
+    ).fetchone()
+    resumen = conn.execute(
+        "SELECT hasta_orden, contenido, fecha FROM Resumen WHERE chat_id = ?", (chat_id,)
+    ).fetchone()
+    adjuntos: Dict[int, List[str]] = {}
+    for historial_id, sha256 in conn.execute(
+        "SELECT ha.historial_id, ha.sha256 FROM HistorialAttachment AS ha "
+        "JOIN Historial AS h ON h.id = ha.historial_id WHERE h.chat_id = ?", (chat_id,)
+    ):
+        adjuntos.setdefault(historial_id, []).append(sha256)
+    mensajes = [
+        {"orden": orden, "role": role, "contenido": descomprimir(contenido, codec), "fecha": fecha,
+         "adjuntos": adjuntos.get(historial_id, [])}
+        for historial_id, orden, role, contenido, codec, fecha in conn.execute(
+            "SELECT id, orden, role, contenido, codec, fecha FROM Historial WHERE chat_id = ? ORDER BY orden",
+            (chat_id,)
+        )
+    ]
+    return {
+        "chat": dict(zip(("id", "user_id", "titulo", "fecha_creacion", "ultimo_orden"), chat)),
+        "resumen": dict(zip(("hasta_orden", "contenido", "fecha"), resumen)) if resumen else None,
+        "mensajes": mensajes,
+    }
+
+
+def archivar_chat(pool: ConnectionPool, chat_id: int, user_id: int,
+                  directorio: Optional[str] = None) -> bool:
+    """
+    Escribe el chat como una línea JSON en el segmento del usuario (un miembro gzip
+    propio, para poder leerlo sin descomprimir el segmento entero) y, ya en disco,
+    borra sus mensajes de Historial. Devuelve False si el chat recibió mensajes
+    mientras se archivaba, en cuyo caso queda como estaba. Sin `directorio`, se usa
+    `directorio_archivo()`.
+    """
+    directorio = directorio or directorio_archivo()
+    with pool.conexion() as conn:
+        registro = _registro(conn, chat_id)
+    linea = json.dumps(registro, ensure_ascii=False) + "\n"
+    datos = gzip.compress(linea.encode("utf-8"))
+
+    with _lock_segmentos:
+        ruta = _segmento(directorio, user_id)
+        with open(ruta, "ab") as f:
+            desplazamiento = f.tell()
+            f.write(datos)
+            f.flush()
+            os.fsync(f.fileno())
+
+    with pool.transaccion() as conn:
+        ultimo_orden = conn.execute("SELECT ultimo_orden FROM Chat WHERE id = ?", (chat_id,)).fetchone()
+        if ultimo_orden is None or ultimo_orden[0] != registro["chat"]["ultimo_orden"]:
+            # El miembro escrito queda huérfano en el segmento; no se referencia.
+            return False
+        conn.execute(
+            "INSERT INTO ChatArchivado (chat_id, ruta, desplazamiento, longitud, mensajes) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, ruta, desplazamiento, len(datos), len(registro["mensajes"]))
+        )
+        # HistorialAttachment se borra en cascada.
+        conn.execute("DELETE FROM Historial WHERE chat_id = ?", (chat_id,))
+        conn.execute("DELETE FROM Resumen WHERE chat_id = ?", (chat_id,))
+    return True
+
+
+def esta_archivado(conn: sqlite3.Connection, chat_id: int) -> bool:
+    return conn.execute("SELECT 1 FROM ChatArchivado WHERE chat_id = ?", (chat_id,)).fetchone() is not None
+
+
+def _leer(ruta: str, desplazamiento: int, longitud: int) -> Dict:
+    with open(ruta, "rb") as f:
+        f.seek(desplazamiento)
+        return json.loads(gzip.decompress(f.read(longitud)).decode("utf-8"))
+
+
+def leer_archivado(conn: sqlite3.Connection, chat_id: int) -> Optional[Dict]:
+    """Registro de un chat archivado (chat, resumen y mensajes) sin rehidratarlo, o None."""
+    fila = conn.execute(
+        "SELECT ruta, desplazamiento, longitud FROM ChatArchivado WHERE chat_id = ?", (chat_id,)
+    ).fetchone()
+    return _leer(*fila) if fila else None
+
+
+def rehidratar(pool: ConnectionPool, chat_id: int) -> bool:
+    """
+    Devuelve a Historial los mensajes de un chat archivado, con su `orden`, fecha,
+    resumen y adjuntos originales. Devuelve False si el chat no estaba archivado.
+    """
+    with pool.conexion() as conn:
+        fila = conn.execute(
+            "SELECT ruta, desplazamiento, longitud FROM ChatArchivado WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+    if fila is None:
+        return False
+
+    registro = _leer(*fila)
+
+    with pool.transaccion() as conn:
+        # Otro hilo pudo haberlo rehidratado mientras se leía el segmento.
+        if not esta_archivado(conn, chat_id):
+            return True
+        for mensaje in registro["mensajes"]:
+            valor, codec = comprimir(mensaje["contenido"])
+            historial_id = conn.execute(
+                "INSERT INTO Historial (chat_id, orden, role, contenido, codec, fecha) VALUES (?, ?, ?, ?, ?, ?)",
+                (chat_id, mensaje["orden"], mensaje["role"], valor, codec, mensaje["fecha"])
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO HistorialAttachment (historial_id, sha256) "
+                "SELECT ?, sha256 FROM Attachment WHERE sha256 = ?",
+                [(historial_id, sha256) for sha256 in mensaje["adjuntos"]]
+            )
+        resumen = registro["resumen"]
+        if resumen:
+            conn.execute(
+                "INSERT OR REPLACE INTO Resumen (chat_id, hasta_orden, contenido, fecha) VALUES (?, ?, ?, ?)",
+                (chat_id, resumen["hasta_orden"], resumen["contenido"], resumen["fecha"])
+            )
+        conn.execute("DELETE FROM ChatArchivado WHERE chat_id = ?", (chat_id,))
+    return True
+
+
+def vacuum_incremental(pool: ConnectionPool, paginas: Optional[int] = None) -> bool:
+    """
+    Devuelve al sistema de archivos hasta `paginas` páginas libres (todas si es None).
+    Solo actúa si la base ya está en auto_vacuum incremental; nunca hace un VACUUM
+    completo. Devuelve False si la base aún no se convirtió (ver `convertir_auto_vacuum`).
+    """
+    with pool.conexion() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return False
+        pragma = "PRAGMA incremental_vacuum" if paginas is None else f"PRAGMA incremental_vacuum({int(paginas)})"
+        # incremental_vacuum avanza a medida que se recorren sus filas.
+        conn.execute(pragma).fetchall()
+    return True
+
+
+def convertir_auto_vacuum(pool: ConnectionPool) -> bool:
+    """
+    Paso de mantenimiento, una sola vez por base: pasa una base creada antes de
+    auto_vacuum incremental a ese modo. Requiere un VACUUM completo, que reescribe
+    toda la base, necesita hasta el doble de su tamaño en disco y bloquea a los demás
+    escritores mientras dura: correrlo con la aplicación cerrada
+    (python archivar_chats.py --convertir-auto-vacuum). Devuelve False si ya estaba convertida.
+    """
+    with pool.conexion() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    return True
+
+
+def archivar_inactivos(pool: ConnectionPool, dias: int, directorio: Optional[str] = None,
+                       limite: Optional[int] = None) -> List[int]:
+    """Archiva los chats inactivos hace más de `dias` días y compacta la base. Devuelve sus ids."""
+    with pool.conexion() as conn:
+        candidatos = chats_inactivos(conn, dias, limite)
+    archivados = [chat_id for chat_id, user_id in candidatos
+                  if archivar_chat(pool, chat_id, user_id, directorio)]
+    if archivados and not vacuum_incremental(pool):
+        print("La base no está en auto_vacuum incremental: el espacio liberado queda en la "
+              "lista de páginas libres hasta correr archivar_chats.py --convertir-auto-vacuum.")
+    return archivados
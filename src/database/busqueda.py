@@ -0,0 +1,57 @@
+import sqlite3
+from typing import Dict, List
+
+
+def _consulta_fts(texto: str) -> str:
+    """Convierte el texto del usuario en una consulta FTS5 segura: todos los términos, literales."""
+    return " ".join('"' + termino.replace('"', '""') + '"' for termino in texto.split())
+
+
+def hay_fts(conn: sqlite3.Connection) -> bool:
+    fila = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'HistorialFTS'"
+    ).fetchone()
+    return fila is not None
+
+
+def buscar_mensajes(conn: sqlite3.Connection, user_id: int, texto: str, limite: int = 20) -> List[Dict]:
+    """
+    Busca en los mensajes de los chats de un usuario. Devuelve los resultados más
+    relevantes primero (bm25) con un fragmento del mensaje alrededor de los términos.
+    """
+    consulta = _consulta_fts(texto)
+    if not consulta:
+        return []
+
+    if hay_fts(conn):
+        cursor = conn.execute(
+            """
+            SELECT h.chat_id, c.titulo, h.orden, h.role, h.fecha,
+                   snippet(HistorialFTS, 0, '[', ']', '…', 16)
+            FROM HistorialFTS
+            JOIN Historial AS h ON h.id = HistorialFTS.rowid
+            JOIN Chat AS c ON c.id = h.chat_id
+            WHERE HistorialFTS MATCH ? AND c.user_id = ?
+            ORDER BY bm25(HistorialFTS)
+            LIMIT ?
+            """,
+            (consulta, user_id, limite)
+        )
+    else:
+        cursor = conn.execute(
+            """
+            SELECT h.chat_id, c.titulo, h.orden, h.role, h.fecha, substr(h.contenido, 1, 200)
+            FROM HistorialTexto AS h
+            JOIN Chat AS c ON c.id = h.chat_id
+            WHERE c.user_id = ? AND h.contenido LIKE ?
+            ORDER BY h.fecha DESC
+            LIMIT ?
+            """,
+            (user_id, f"%{texto.strip()}%", limite)
+        )
+
+    return [
+        {"chat_id": row[0], "titulo": row[1], "orden": row[2], "role": row[3],
+         "fecha": row[4], "fragmento": row[5]}
+        for row in cursor.fetchall()
+    ]
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+import zlib
+from typing import Optional, Tuple, Union
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional; sin él se usa zlib
+    zstandard = None
+
+# Valores de la columna Historial.codec.
+TEXTO = 0
+ZLIB = 1
+ZSTD = 2
+
+_NOMBRES = {"ninguno": TEXTO, "zlib": ZLIB, "zstd": ZSTD}
+
+
+# Códec de los mensajes nuevos y tamaño (bytes UTF-8) a partir del cual se comprimen.
+# Se leen al usarlos y no al importar el módulo: el .env se carga después (cliente.py).
+def codec_configurado() -> int:
+    nombre = os.getenv("TESISIA_CODEC", "zstd" if zstandard else "zlib")
+    codec = _NOMBRES.get(nombre, ZLIB)
+    if codec == ZSTD and zstandard is None:
+        return ZLIB
+    return codec
+
+
+def umbral_configurado() -> int:
+    return int(os.getenv("TESISIA_COMPRIMIR_DESDE", "1024"))
+
+
+def comprimir(texto: str, codec: Optional[int] = None, umbral: Optional[int] = None) -> Tuple[Union[str, bytes], int]:
+    """
+    Devuelve (valor a guardar, codec). Los textos cortos, o los que no se achican al
+    menos un 10 %, se guardan tal cual.
+    """
+    codec = codec_configurado() if codec is None else codec
+    umbral = umbral_configurado() if umbral is None else umbral
+    datos = texto.encode("utf-8")
+    if codec == TEXTO or len(datos) < umbral:
+        return texto, TEXTO
+    if codec == ZSTD:
+        comprimido = zstandard.ZstdCompressor(level=6).compress(datos)
+    else:
+        comprimido = zlib.compress(datos, 6)
+    if len(comprimido) > len(datos) * 0.9:
+        return texto, TEXTO
+    return comprimido, codec
+
+
+def descomprimir(valor: Union[str, bytes, None], codec: int) -> Optional[str]:
+    """Inversa de `comprimir`. También se registra como función SQL en cada conexión."""
+    if valor is None or codec == TEXTO:
+        return valor
+    if codec == ZLIB:
+        return zlib.decompress(valor).decode("utf-8")
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Hay mensajes comprimidos con zstd y el paquete 'zstandard' no está instalado")
+        return zstandard.ZstdDecompressor().decompress(valor).decode("utf-8")
+    raise ValueError(f"Códec desconocido: {codec}")
+
+
+def registrar_funciones(conn: sqlite3.Connection):
+    """
+    Registra `descomprimir` como función SQL en la conexión. La vista HistorialTexto y
+    los triggers del índice FTS la usan: sin ella falla cualquier lectura de la vista y
+    todo INSERT/UPDATE/DELETE en Historial, también desde herramientas externas.
+    """
+    conn.create_function("descomprimir", 2, descomprimir, deterministic=True)
@@ -0,0 +1,245 @@
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, TypeVar
+
+from database.codec import comprimir
+from database.storage import ConnectionPool, get_pool
+
+
+# UPDATE ... RETURNING existe desde SQLite 3.35.
+_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Cuánto espera el cierre al salir del proceso a que se guarde lo pendiente.
+ESPERA_AL_SALIR = 15.0
+
+T = TypeVar("T")
+
+
+def consumir_en_lotes(cola: "queue.Queue[Optional[T]]", max_lote: int, procesar: Callable[[List[T]], None]):
+    """
+    Bucle de los hilos de escritura diferida: espera el primer elemento, junta lo que
+    se acumuló en la cola hasta `max_lote` y llama a `procesar` con el lote, en orden
+    de llegada. Un None en la cola lo detiene, después de procesar lo anterior a él.
+    """
+    while True:
+        primero = cola.get()
+        if primero is None:
+            return
+        lote = [primero]
+        detener = False
+        while len(lote) < max_lote:
+            try:
+                siguiente = cola.get_nowait()
+            except queue.Empty:
+                break
+            if siguiente is None:
+                detener = True
+                break
+            lote.append(siguiente)
+        procesar(lote)
+        if detener:
+            return
+
+
+def siguiente_orden(conn: sqlite3.Connection, chat_id: int) -> int:
+    """
+    Reserva el siguiente `orden` del chat incrementando Chat.ultimo_orden. Debe
+    llamarse dentro de la transacción del INSERT: el UPDATE toma el bloqueo de
+    escritura, así dos escritores nunca obtienen el mismo número.
+    """
+    if _RETURNING:
+        fila = conn.execute(
+            "UPDATE Chat SET ultimo_orden = ultimo_orden + 1 WHERE id = ? RETURNING ultimo_orden",
+            (chat_id,)
+        ).fetchone()
+    else:
+        conn.execute("UPDATE Chat SET ultimo_orden = ultimo_orden + 1 WHERE id = ?", (chat_id,))
+        fila = conn.execute("SELECT ultimo_orden FROM Chat WHERE id = ?", (chat_id,)).fetchone()
+    if fila is None:
+        raise sqlite3.IntegrityError(f"No existe el chat {chat_id}")
+    return fila[0]
+
+
+def insertar_mensaje(conn: sqlite3.Connection, chat_id: int, role: str, contenido: str):
+    """Inserta un mensaje al final del chat y devuelve (historial_id, orden)."""
+    orden = siguiente_orden(conn, chat_id)
+    valor, codec = comprimir(contenido)
+    cursor = conn.execute(
+        "INSERT INTO Historial (chat_id, orden, role, contenido, codec) VALUES (?, ?, ?, ?, ?)",
+        (chat_id, orden, role, valor, codec)
+    )
+    return cursor.lastrowid, orden
+
+
+def _es_bloqueo(e: sqlite3.OperationalError) -> bool:
+    """Errores pasajeros: la base o una tabla bloqueada por otro escritor (SQLITE_BUSY/LOCKED)."""
+    mensaje = str(e).lower()
+    return "locked" in mensaje or "busy" in mensaje
+
+
+@dataclass
+class _Escritura:
+    chat_id: int
+    role: str
+    contenido: str
+    # Se ejecuta en la misma transacción, con (conn, historial_id).
+    en_transaccion: Optional[Callable[[sqlite3.Connection, int], None]] = None
+    # Se ejecuta después del commit, con (historial_id, orden).
+    al_confirmar: Optional[Callable[[int, int], None]] = None
+
+
+class EscritorHistorial:
+    """
+    Escritura diferida (write-behind) de mensajes en Historial. Los mensajes se
+    encolan sin esperar al disco y un hilo los guarda en transacciones agrupadas:
+    todo lo que se acumuló mientras se escribía el lote anterior va en un solo commit.
+    El orden de llegada se respeta, así el mensaje del usuario siempre queda antes de
+    la respuesta. `flush()` espera a que lo encolado hasta ese momento esté en disco.
+
+    Si la base está bloqueada u ocupada el lote se reintenta con espera exponencial y
+    sigue pendiente, hasta `max_reintentos` veces; si sigue bloqueada (p. ej. durante
+    un VACUUM) el lote se descarta. También se descarta un mensaje cuando el error es
+    del mensaje mismo (IntegrityError, p. ej. de un chat ya borrado, o un error en su
+    `en_transaccion`). Lo descartado se cuenta en `errores`, lo informa `flush()` y su
+    `al_confirmar` no se ejecuta.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_lote: int = 256, max_reintentos: int = 8,
+                 espera_base: float = 0.05, espera_maxima: float = 2.0):
+        self.pool = pool
+        self.max_lote = max_lote
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.errores = 0
+        self.reintentos = 0
+        self._cola: "queue.Queue[Optional[_Escritura]]" = queue.Queue()
+        self._condicion = threading.Condition()
+        self._encolados = 0
+        self._confirmados = 0
+        self._errores_reportados = 0
+        self._hilo = threading.Thread(target=self._trabajar, name="escritor-historial", daemon=True)
+        self._hilo.start()
+
+    def encolar(self, chat_id: int, role: str, contenido: str,
+                en_transaccion: Optional[Callable[[sqlite3.Connection, int], None]] = None,
+                al_confirmar: Optional[Callable[[int, int], None]] = None):
+        if not self._hilo.is_alive():
+            raise RuntimeError("El escritor del historial ya está cerrado")
+        with self._condicion:
+            self._encolados += 1
+        self._cola.put(_Escritura(chat_id, role, contenido, en_transaccion, al_confirmar))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Barrera de durabilidad: espera a que lo encolado antes de llamar esté procesado.
+        Devuelve False si se venció el timeout o si desde el flush anterior se descartó
+        algún mensaje; True si todo se guardó.
+        """
+        with self._condicion:
+            objetivo = self._encolados
+            if not self._condicion.wait_for(lambda: self._confirmados >= objetivo, timeout):
+                return False
+            sin_errores = self.errores == self._errores_reportados
+            self._errores_reportados = self.errores
+            return sin_errores
+
+    def pendientes(self) -> int:
+        with self._condicion:
+            return self._encolados - self._confirmados
+
+    def cerrar(self, timeout: Optional[float] = None):
+        """Guarda lo pendiente y detiene el hilo."""
+        if self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+    def _trabajar(self):
+        consumir_en_lotes(self._cola, self.max_lote, self._procesar)
+
+    def _procesar(self, lote: List[_Escritura]):
+        self._escribir(lote)
+        with self._condicion:
+            self._confirmados += len(lote)
+            self._condicion.notify_all()
+
+    def _escribir(self, lote: List[_Escritura]):
+        try:
+            confirmadas = self._reintentando(lote)
+        except sqlite3.OperationalError as e:
+            if not _es_bloqueo(e):
+                confirmadas = self._uno_por_uno(lote)
+            else:
+                # Se agotaron los reintentos: probar uno por uno solo alargaría la espera.
+                confirmadas = []
+                with self._condicion:
+                    self.errores += len(lote)
+                print(f"No se pudieron guardar {len(lote)} mensajes, la base sigue bloqueada: {e}")
+        except Exception:
+            confirmadas = self._uno_por_uno(lote)
+
+        for escritura, historial_id, orden in confirmadas:
+            if escritura.al_confirmar is not None:
+                try:
+                    escritura.al_confirmar(historial_id, orden)
+                except Exception as e:
+                    print(f"Error después de guardar el mensaje {historial_id}: {e}")
+
+    def _uno_por_uno(self, lote: List[_Escritura]):
+        """Un mensaje inválido no debe tumbar el lote: se guarda cada uno por separado."""
+        confirmadas = []
+        for escritura in lote:
+            try:
+                confirmadas.extend(self._reintentando([escritura]))
+            except Exception as e:
+                with self._condicion:
+                    self.errores += 1
+                print(f"No se pudo guardar el mensaje del chat {escritura.chat_id}: {e}")
+        return confirmadas
+
+    def _reintentando(self, lote: List[_Escritura]):
+        """
+        Ejecuta la transacción; si la base está bloqueada u ocupada, espera y la repite
+        hasta `max_reintentos` veces antes de propagar el error.
+        """
+        intento = 0
+        while True:
+            try:
+                return self._transaccion(lote)
+            except sqlite3.OperationalError as e:
+                if not _es_bloqueo(e) or intento >= self.max_reintentos:
+                    raise
+                if intento == 0:
+                    print(f"Base no disponible al guardar el historial, se reintenta: {e}")
+                self.reintentos += 1
+                time.sleep(min(self.espera_maxima, self.espera_base * 2 ** intento))
+                intento += 1
+
+    def _transaccion(self, lote: List[_Escritura]):
+        confirmadas = []
+        with self.pool.transaccion() as conn:
+            for escritura in lote:
+                historial_id, orden = insertar_mensaje(conn, escritura.chat_id, escritura.role, escritura.contenido)
+                if escritura.en_transaccion is not None:
+                    escritura.en_transaccion(conn, historial_id)
+                confirmadas.append((escritura, historial_id, orden))
+        return confirmadas
+
+
+_escritor: Optional[EscritorHistorial] = None
+_escritor_lock = threading.Lock()
+
+
+def get_escritor() -> EscritorHistorial:
+    """Escritor compartido por el proceso; al salir se guarda lo que quede pendiente."""
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None:
+            _escritor = EscritorHistorial(get_pool())
+            # Con límite: una base bloqueada no debe colgar la salida del intérprete.
+            atexit.register(_escritor.cerrar, ESPERA_AL_SALIR)
+        return _escritor
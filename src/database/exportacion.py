@@ -0,0 +1,173 @@
+import json
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from database.archivo import leer_archivado
+from database.codec import comprimir, descomprimir
+from database.storage import ConnectionPool
+
+# Filas por fetchmany al exportar y por transacción al importar.
+LOTE = 500
+
+# Formato JSONL: una línea por registro, en este orden para cada chat:
+#   {"tipo": "chat", "id", "titulo", "fecha_creacion"}
+#   {"tipo": "resumen", "chat_id", "hasta_orden", "contenido", "fecha"}        (opcional)
+#   {"tipo": "mensaje", "chat_id", "orden", "role", "contenido", "fecha", "adjuntos"}
+# Los mensajes de un chat siempre siguen a su línea "chat".
+
+
+def exportar_chats(pool: ConnectionPool, user_id: int, lote: int = LOTE) -> Iterator[Dict]:
+    """
+    Genera los registros de todos los chats del usuario, incluidos los archivados,
+    leyendo de a `lote` filas. Todo se lee dentro de una misma transacción de lectura,
+    así la exportación es una foto consistente aunque la aplicación siga escribiendo.
+    """
+    with pool.conexion() as conn:
+        conn.execute("BEGIN")
+        chats = conn.execute(
+            "SELECT c.id, c.titulo, c.fecha_creacion, a.chat_id IS NOT NULL "
+            "FROM Chat AS c LEFT JOIN ChatArchivado AS a ON a.chat_id = c.id "
+            "WHERE c.user_id = ? ORDER BY c.fecha_creacion, c.id",
+            (user_id,)
+        )
+        while True:
+            filas = chats.fetchmany(lote)
+            if not filas:
+                break
+            for chat_id, titulo, fecha_creacion, archivado in filas:
+                yield {"tipo": "chat", "id": chat_id, "titulo": titulo, "fecha_creacion": fecha_creacion}
+                if archivado:
+                    yield from _registros_archivados(leer_archivado(conn, chat_id))
+                else:
+                    yield from _registros_chat(conn, chat_id, lote)
+
+
+def _registros_chat(conn, chat_id: int, lote: int) -> Iterator[Dict]:
+    resumen = conn.execute(
+        "SELECT hasta_orden, contenido, fecha FROM Resumen WHERE chat_id = ?", (chat_id,)
+    ).fetchone()
+    if resumen:
+        yield {"tipo": "resumen", "chat_id": chat_id, "hasta_orden": resumen[0],
+               "contenido": resumen[1], "fecha": resumen[2]}
+
+    mensajes = conn.execute(
+        "SELECT h.orden, h.role, h.contenido, h.codec, h.fecha, "
+        "       (SELECT group_concat(sha256) FROM HistorialAttachment WHERE historial_id = h.id) "
+        "FROM Historial AS h WHERE h.chat_id = ? ORDER BY h.orden",
+        (chat_id,)
+    )
+    while True:
+        filas = mensajes.fetchmany(lote)
+        if not filas:
+            break
+        for orden, role, contenido, codec, fecha, adjuntos in filas:
+            yield {"tipo": "mensaje", "chat_id": chat_id, "orden": orden, "role": role,
+                   "contenido": descomprimir(contenido, codec), "fecha": fecha,
+                   "adjuntos": adjuntos.split(",") if adjuntos else []}
+
+
+def _registros_archivados(registro: Dict) -> Iterator[Dict]:
+    """Mismos registros que `_registros_chat`, a partir del segmento de un chat archivado."""
+    chat_id = registro["chat"]["id"]
+    if registro["resumen"]:
+        yield {"tipo": "resumen", "chat_id": chat_id, **registro["resumen"]}
+    for mensaje in registro["mensajes"]:
+        yield {"tipo": "mensaje", "chat_id": chat_id, **mensaje}
+
+
+def importar_chats(pool: ConnectionPool, user_id: int, registros: Iterable[Dict],
+                   lote: int = LOTE) -> Dict[int, int]:
+    """
+    Crea los chats de `registros` (en el formato de `exportar_chats`) como chats nuevos
+    del usuario, conservando títulos, fechas y `orden`. Inserta con executemany en
+    transacciones de hasta `lote` registros. Devuelve {chat_id original: chat_id nuevo}.
+    Los adjuntos solo se vuelven a vincular si el archivo ya está en Attachment.
+    """
+    nuevos: Dict[int, int] = {}
+    pendientes: List[Dict] = []
+    for registro in registros:
+        if registro["tipo"] == "chat":
+            # El id del chat nuevo hace falta antes de insertar sus mensajes.
+            _guardar_lote(pool, pendientes, nuevos)
+            pendientes = []
+            with pool.transaccion() as conn:
+                nuevos[registro["id"]] = conn.execute(
+                    "INSERT INTO Chat (user_id, titulo, fecha_creacion) VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+                    (user_id, registro["titulo"], registro.get("fecha_creacion"))
+                ).lastrowid
+        else:
+            pendientes.append(registro)
+            if len(pendientes) >= lote:
+                _guardar_lote(pool, pendientes, nuevos)
+                pendientes = []
+    _guardar_lote(pool, pendientes, nuevos)
+    return nuevos
+
+
+def _guardar_lote(pool: ConnectionPool, registros: List[Dict], nuevos: Dict[int, int]):
+    if not registros:
+        return
+    mensajes = []
+    adjuntos = []
+    resumenes = []
+    for r in registros:
+        chat_id = nuevos[r["chat_id"]]
+        if r["tipo"] == "mensaje":
+            valor, codec = comprimir(r["contenido"])
+            mensajes.append((chat_id, r["orden"], r["role"], valor, codec, r.get("fecha")))
+            adjuntos.extend((sha256, chat_id, r["orden"]) for sha256 in r.get("adjuntos", []))
+        elif r["tipo"] == "resumen":
+            resumenes.append((chat_id, r["hasta_orden"], r["contenido"], r.get("fecha")))
+
+    with pool.transaccion() as conn:
+        conn.executemany(
+            "INSERT INTO Historial (chat_id, orden, role, contenido, codec, fecha) "
+            "VALUES (?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+            mensajes
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO HistorialAttachment (historial_id, sha256) "
+            "SELECT h.id, a.sha256 FROM Attachment AS a JOIN Historial AS h ON h.chat_id = ? AND h.orden = ? "
+            "WHERE a.sha256 = ?",
+            [(chat_id, orden, sha256) for sha256, chat_id, orden in adjuntos]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO Resumen (chat_id, hasta_orden, contenido, fecha) "
+            "VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))",
+            resumenes
+        )
+        # Los mensajes nuevos del chat importado deben numerarse después de los importados.
+        conn.executemany(
+            "UPDATE Chat SET ultimo_orden = MAX(ultimo_orden, "
+            "(SELECT COALESCE(MAX(orden), 0) FROM Historial WHERE chat_id = ?)) WHERE id = ?",
+            [(chat_id, chat_id) for chat_id in {m[0] for m in mensajes}]
+        )
+
+
+def escribir_jsonl(registros: Iterable[Dict], f: TextIO) -> int:
+    """Escribe un registro por línea y devuelve cuántos escribió."""
+    n = 0
+    for registro in registros:
+        f.write(json.dumps(registro, ensure_ascii=False))
+        f.write("\n")
+        n += 1
+    return n
+
+
+def leer_jsonl(f: TextIO) -> Iterator[Dict]:
+    for linea in f:
+        if linea.strip():
+            yield json.loads(linea)
+
+
+def a_markdown(registros: Iterable[Dict], titulo: Optional[str] = None) -> Iterator[str]:
+    """Convierte los registros en fragmentos de Markdown legible (solo exportación)."""
+    if titulo:
+        yield f"# {titulo}\n\n"
+    nombres = {"user": "Estudiante", "model": "Anglai"}
+    for r in registros:
+        if r["tipo"] == "chat":
+            yield f"## {r['titulo'] or 'Chat'} ({r['fecha_creacion']})\n\n"
+        elif r["tipo"] == "resumen":
+            yield f"> Resumen de los primeros {r['hasta_orden']} mensajes: {r['contenido']}\n\n"
+        else:
+            yield f"**{nombres.get(r['role'], r['role'])}** — {r['fecha']}\n\n{r['contenido']}\n\n"
@@ -0,0 +1,159 @@
+import atexit
+import math
+import os
+import queue
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from database.escritura import consumir_en_lotes
+from database.storage import ConnectionPool, get_pool
+
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class RegistroSolicitud:
+    """Lo medido en una solicitud al modelo; `etapas` en milisegundos."""
+    operacion: str
+    total_ms: float
+    etapas: Dict[str, float] = field(default_factory=dict)
+    user_id: Optional[int] = None
+    chat_id: Optional[int] = None
+    cacheada: bool = False
+    error: Optional[str] = None
+    tokens_prompt: Optional[int] = None
+    tokens_respuesta: Optional[int] = None
+    tokens_cache: Optional[int] = None
+
+
+class RegistroMetricas:
+    """
+    Guarda las métricas en segundo plano, como EscritorHistorial con los mensajes:
+    medir una solicitud no debe sumarle un commit. Lo acumulado se escribe en una
+    sola transacción por lote.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_lote: int = 256):
+        self.pool = pool
+        self.max_lote = max_lote
+        self._cola: "queue.Queue[Optional[RegistroSolicitud]]" = queue.Queue()
+        self._hilo = threading.Thread(target=self._trabajar, name="registro-metricas", daemon=True)
+        self._hilo.start()
+
+    def registrar(self, registro: RegistroSolicitud):
+        if self._hilo.is_alive():
+            self._cola.put(registro)
+
+    def cerrar(self, timeout: Optional[float] = None):
+        if self._hilo.is_alive():
+            self._cola.put(None)
+            self._hilo.join(timeout)
+
+    def _trabajar(self):
+        consumir_en_lotes(self._cola, self.max_lote, self._procesar)
+
+    def _procesar(self, lote: List[RegistroSolicitud]):
+        try:
+            self._escribir(lote)
+        except Exception as e:
+            # Perder métricas no debe afectar a la aplicación.
+            print(f"No se pudieron guardar {len(lote)} métricas: {e}")
+
+    def _escribir(self, lote: List[RegistroSolicitud]):
+        with self.pool.transaccion() as conn:
+            for r in lote:
+                metrica_id = conn.execute(
+                    "INSERT INTO Metrica (operacion, user_id, chat_id, cacheada, error, tokens_prompt, "
+                    "tokens_respuesta, tokens_cache, total_ms) "
+                    "VALUES (?, COALESCE(?, (SELECT user_id FROM Chat WHERE id = ?)), ?, ?, ?, ?, ?, ?, ?)",
+                    (r.operacion, r.user_id, r.chat_id, r.chat_id, int(r.cacheada), r.error,
+                     r.tokens_prompt, r.tokens_respuesta, r.tokens_cache, r.total_ms)
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO MetricaEtapa (metrica_id, etapa, ms) VALUES (?, ?, ?)",
+                    [(metrica_id, etapa, ms) for etapa, ms in r.etapas.items()]
+                )
+
+
+_registro: Optional[RegistroMetricas] = None
+_registro_lock = threading.Lock()
+
+
+def get_registro() -> Optional[RegistroMetricas]:
+    """Registro compartido por el proceso, o None si las métricas están desactivadas."""
+    global _registro
+    # Con TESISIA_METRICAS=0 no se guarda nada. Se lee aquí, con el .env ya cargado.
+    if os.getenv("TESISIA_METRICAS", "1") == "0":
+        return None
+    with _registro_lock:
+        if _registro is None:
+            _registro = RegistroMetricas(get_pool())
+            atexit.register(_registro.cerrar)
+        return _registro
+
+
+def _percentiles(conn: sqlite3.Connection, consulta: str, params: tuple) -> Dict[str, float]:
+    """
+    Percentiles por rango más cercano de una consulta que devuelve `ms` ordenado: se
+    cuenta y se salta hasta cada posición con OFFSET, sin traer todas las filas.
+    """
+    n = conn.execute(f"SELECT COUNT(*) FROM ({consulta})", params).fetchone()[0]
+    resultado: Dict[str, float] = {"n": n}
+    for p in PERCENTILES:
+        if n == 0:
+            resultado[f"p{p}"] = None
+            continue
+        posicion = max(math.ceil(p / 100 * n) - 1, 0)
+        resultado[f"p{p}"] = conn.execute(f"{consulta} LIMIT 1 OFFSET ?", params + (posicion,)).fetchone()[0]
+    return resultado
+
+
+def latencias(conn: sqlite3.Connection, dias: int = 7, operacion: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+    """{etapa: {"n", "p50", "p95", "p99"}} de los últimos `dias` días; "total" es la solicitud completa."""
+    filtro = "m.fecha >= datetime('now', ?)"
+    params: tuple = (f"-{dias} days",)
+    if operacion is not None:
+        filtro += " AND m.operacion = ?"
+        params += (operacion,)
+
+    etapas = [fila[0] for fila in conn.execute(
+        f"SELECT DISTINCT e.etapa FROM MetricaEtapa AS e JOIN Metrica AS m ON m.id = e.metrica_id "
+        f"WHERE {filtro} ORDER BY e.etapa", params
+    )]
+    resultado = {
+        etapa: _percentiles(
+            conn,
+            f"SELECT e.ms FROM MetricaEtapa AS e JOIN Metrica AS m ON m.id = e.metrica_id "
+            f"WHERE e.etapa = ? AND {filtro} ORDER BY e.ms",
+            (etapa,) + params
+        )
+        for etapa in etapas
+    }
+    resultado["total"] = _percentiles(conn, f"SELECT m.total_ms FROM Metrica AS m WHERE {filtro} ORDER BY m.total_ms", params)
+    return resultado
+
+
+def tokens_por_usuario(conn: sqlite3.Connection, dias: int = 7) -> List[Dict]:
+    """Solicitudes y tokens por usuario y por día, del día más reciente al más antiguo."""
+    cursor = conn.execute(
+        """
+        SELECT date(fecha), user_id, COUNT(*), SUM(cacheada), SUM(error IS NOT NULL),
+               COALESCE(SUM(tokens_prompt), 0), COALESCE(SUM(tokens_respuesta), 0),
+               COALESCE(SUM(tokens_cache), 0)
+        FROM Metrica
+        WHERE fecha >= datetime('now', ?)
+        GROUP BY date(fecha), user_id
+        ORDER BY date(fecha) DESC, user_id
+        """,
+        (f"-{dias} days",)
+    )
+    campos = ("dia", "user_id", "solicitudes", "cacheadas", "errores",
+              "tokens_prompt", "tokens_respuesta", "tokens_cache")
+    return [dict(zip(campos, fila)) for fila in cursor]
+
+
+def purgar(conn: sqlite3.Connection, dias: int) -> int:
+    """Borra las métricas con más de `dias` días. Devuelve cuántas solicitudes borró."""
+    return conn.execute("DELETE FROM Metrica WHERE fecha < datetime('now', ?)", (f"-{dias} days",)).rowcount
@@ -0,0 +1,341 @@
+import sqlite3
+from typing import Callable, List
+
+from database.codec import registrar_funciones
+
+
+def _m001_esquema_inicial(conn: sqlite3.Connection):
+    """Tablas base. Usa IF NOT EXISTS para adoptar bases creadas antes de las migraciones."""
+    # Tabla de Usuarios
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS User (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        correo TEXT NOT NULL UNIQUE, -- Añadido UNIQUE para evitar correos duplicados
+        password TEXT NOT NULL,
+        nombre TEXT NOT NULL,
+        usuario TEXT NOT NULL UNIQUE -- Añadido UNIQUE para evitar usuarios duplicados
+    )
+    ''')
+
+    # Tabla de Chats
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS Chat (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        titulo TEXT ,
+        FOREIGN KEY (user_id) REFERENCES User(id)
+    )
+    ''')
+
+    # Tabla de Historial
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS Historial (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        orden INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        contenido TEXT NOT NULL,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES Chat(id)
+    )
+    ''')
+
+
+def _m002_indices(conn: sqlite3.Connection):
+    """
+    Índices para las consultas de cada turno y de la lista de chats.
+    Antes de crear el índice único se renumeran los chats con `orden` duplicado,
+    conservando el orden de inserción (id). La numeración nueva se calcula completa
+    antes de escribirla: una base con `orden` (1, 2, 2, 3, 3, 4) queda (1, 2, 3, 4, 5, 6)
+    y no (1, 2, 3, 4, 4, 6), que es lo que daba un UPDATE correlacionado con COUNT(*)
+    que leía filas ya renumeradas.
+    """
+    conn.execute('''
+    CREATE TEMP TABLE _renumeracion AS
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY chat_id ORDER BY orden, id) AS orden
+    FROM Historial
+    WHERE chat_id IN (
+        SELECT chat_id FROM Historial GROUP BY chat_id, orden HAVING COUNT(*) > 1
+    )
+    ''')
+    conn.execute('''
+    UPDATE Historial
+    SET orden = (SELECT r.orden FROM _renumeracion AS r WHERE r.id = Historial.id)
+    WHERE id IN (SELECT id FROM _renumeracion)
+    ''')
+    conn.execute("DROP TABLE _renumeracion")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_historial_chat_orden ON Historial (chat_id, orden)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_user_fecha ON Chat (user_id, fecha_creacion)"
+    )
+
+
+def _m003_resumen(conn: sqlite3.Connection):
+    """Resumen acumulado de los turnos viejos de cada chat (hasta `hasta_orden` inclusive)."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS Resumen (
+        chat_id INTEGER PRIMARY KEY,
+        hasta_orden INTEGER NOT NULL,
+        contenido TEXT NOT NULL,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES Chat(id)
+    )
+    ''')
+
+
+def _m004_quitar_prompt_del_historial(conn: sqlite3.Connection):
+    """
+    Las instrucciones de Anglai ahora se envían como system_instruction; se borra la
+    copia que los chats anteriores guardaban como primer mensaje del usuario.
+    """
+    conn.execute('''
+    DELETE FROM Historial
+    WHERE orden = 1 AND role = 'user' AND contenido LIKE 'Actúa como Anglai,%'
+    ''')
+
+
+def _m005_adjuntos(conn: sqlite3.Connection):
+    """Adjuntos direccionados por SHA-256, con la URI de la Files API y su expiración."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS Attachment (
+        sha256 TEXT PRIMARY KEY,
+        nombre TEXT NOT NULL,
+        mime_type TEXT NOT NULL,
+        tamano INTEGER NOT NULL,
+        ruta TEXT,          -- Última ruta local conocida, para volver a subirlo si expira
+        file_uri TEXT,
+        expira REAL,        -- Epoch en segundos
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS HistorialAttachment (
+        historial_id INTEGER NOT NULL,
+        sha256 TEXT NOT NULL,
+        PRIMARY KEY (historial_id, sha256),
+        FOREIGN KEY (historial_id) REFERENCES Historial(id) ON DELETE CASCADE,
+        FOREIGN KEY (sha256) REFERENCES Attachment(sha256)
+    )
+    ''')
+
+
+def _m006_busqueda_fts(conn: sqlite3.Connection):
+    """
+    Índice FTS5 de Historial.contenido (tabla de contenido externo: no duplica el texto),
+    mantenido por triggers y poblado con los mensajes existentes.
+    Si SQLite no trae FTS5 se omite y la búsqueda usa LIKE.
+    """
+    try:
+        conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS HistorialFTS USING fts5(
+            contenido,
+            content='Historial',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        print("FTS5 no disponible, la búsqueda usará LIKE:", e)
+        return
+
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS historial_fts_insert AFTER INSERT ON Historial BEGIN
+        INSERT INTO HistorialFTS (rowid, contenido) VALUES (new.id, new.contenido);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS historial_fts_delete AFTER DELETE ON Historial BEGIN
+        INSERT INTO HistorialFTS (HistorialFTS, rowid, contenido) VALUES ('delete', old.id, old.contenido);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS historial_fts_update AFTER UPDATE OF contenido ON Historial BEGIN
+        INSERT INTO HistorialFTS (HistorialFTS, rowid, contenido) VALUES ('delete', old.id, old.contenido);
+        INSERT INTO HistorialFTS (rowid, contenido) VALUES (new.id, new.contenido);
+    END
+    ''')
+    conn.execute("INSERT INTO HistorialFTS (HistorialFTS) VALUES ('rebuild')")
+
+
+def _m007_respuesta_cache(conn: sqlite3.Connection):
+    """Caché persistente de respuestas por coincidencia exacta del contenido enviado."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS RespuestaCache (
+        clave TEXT PRIMARY KEY,  -- SHA-256 de modelo + instrucciones + contenido
+        respuesta TEXT NOT NULL,
+        creado REAL NOT NULL     -- Epoch en segundos
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_respuesta_cache_creado ON RespuestaCache (creado)")
+
+
+def _m008_contador_orden(conn: sqlite3.Connection):
+    """
+    Contador `ultimo_orden` por chat: el siguiente `orden` se asigna incrementándolo
+    en la misma transacción del INSERT, sin consultar MAX(orden). El índice único de
+    la migración 2 ya garantiza que no hay `orden` duplicados.
+    """
+    conn.execute("ALTER TABLE Chat ADD COLUMN ultimo_orden INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''
+    UPDATE Chat
+    SET ultimo_orden = (SELECT COALESCE(MAX(orden), 0) FROM Historial WHERE chat_id = Chat.id)
+    ''')
+
+
+def _m009_codec_contenido(conn: sqlite3.Connection):
+    """
+    Columna `codec` de Historial (ver database/codec.py): los mensajes largos pueden
+    guardarse comprimidos. La vista HistorialTexto expone el texto ya descomprimido y
+    pasa a ser el contenido externo del índice FTS, que se recrea para indexar texto
+    y no bytes comprimidos. Requiere la función SQL `descomprimir` (codec.registrar_funciones).
+    """
+    conn.execute("ALTER TABLE Historial ADD COLUMN codec INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''
+    CREATE VIEW IF NOT EXISTS HistorialTexto AS
+    SELECT id, chat_id, orden, role, descomprimir(contenido, codec) AS contenido, fecha
+    FROM Historial
+    ''')
+
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'HistorialFTS'").fetchone() is None:
+        return
+    for trigger in ("historial_fts_insert", "historial_fts_delete", "historial_fts_update"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE HistorialFTS")
+    conn.execute('''
+    CREATE VIRTUAL TABLE HistorialFTS USING fts5(
+        contenido,
+        content='HistorialTexto',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''')
+    conn.execute('''
+    CREATE TRIGGER historial_fts_insert AFTER INSERT ON Historial BEGIN
+        INSERT INTO HistorialFTS (rowid, contenido) VALUES (new.id, descomprimir(new.contenido, new.codec));
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER historial_fts_delete AFTER DELETE ON Historial BEGIN
+        INSERT INTO HistorialFTS (HistorialFTS, rowid, contenido)
+        VALUES ('delete', old.id, descomprimir(old.contenido, old.codec));
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER historial_fts_update AFTER UPDATE OF contenido, codec ON Historial BEGIN
+        INSERT INTO HistorialFTS (HistorialFTS, rowid, contenido)
+        VALUES ('delete', old.id, descomprimir(old.contenido, old.codec));
+        INSERT INTO HistorialFTS (rowid, contenido) VALUES (new.id, descomprimir(new.contenido, new.codec));
+    END
+    ''')
+    conn.execute("INSERT INTO HistorialFTS (HistorialFTS) VALUES ('rebuild')")
+
+
+def _m010_archivo(conn: sqlite3.Connection):
+    """
+    Índice de los chats archivados (ver database/archivo.py): el chat sigue en Chat,
+    pero sus mensajes viven en un segmento JSONL comprimido con gzip, como un miembro
+    gzip independiente que empieza en `desplazamiento` y ocupa `longitud` bytes.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS ChatArchivado (
+        chat_id INTEGER PRIMARY KEY,
+        ruta TEXT NOT NULL,
+        desplazamiento INTEGER NOT NULL,
+        longitud INTEGER NOT NULL,
+        mensajes INTEGER NOT NULL,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES Chat(id)
+    )
+    ''')
+
+
+def _m011_metricas(conn: sqlite3.Connection):
+    """
+    Una fila de Metrica por solicitud al modelo (latencia total y tokens) y una de
+    MetricaEtapa por cada etapa medida dentro de ella (ver database/metricas.py).
+    Sin clave foránea a Chat: las métricas sobreviven al borrado del chat.
+    """
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS Metrica (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        operacion TEXT NOT NULL,
+        user_id INTEGER,
+        chat_id INTEGER,
+        cacheada INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        tokens_prompt INTEGER,
+        tokens_respuesta INTEGER,
+        tokens_cache INTEGER,
+        total_ms REAL NOT NULL
+    )
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS MetricaEtapa (
+        metrica_id INTEGER NOT NULL,
+        etapa TEXT NOT NULL,
+        ms REAL NOT NULL,
+        PRIMARY KEY (metrica_id, etapa),
+        FOREIGN KEY (metrica_id) REFERENCES Metrica(id) ON DELETE CASCADE
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_metrica_fecha ON Metrica (fecha)")
+    # Los percentiles por etapa se leen recorriendo este índice en orden.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_metrica_etapa_ms ON MetricaEtapa (etapa, ms)")
+
+
+# Cada migración se aplica una sola vez y en orden; su posición (empezando en 1)
+# es la versión que queda guardada en PRAGMA user_version. Nunca reordenar ni borrar.
+MIGRACIONES: List[Callable[[sqlite3.Connection], None]] = [
+    _m001_esquema_inicial,
+    _m002_indices,
+    _m003_resumen,
+    _m004_quitar_prompt_del_historial,
+    _m005_adjuntos,
+    _m006_busqueda_fts,
+    _m007_respuesta_cache,
+    _m008_contador_orden,
+    _m009_codec_contenido,
+    _m010_archivo,
+    _m011_metricas,
+]
+
+
+def version_actual(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def aplicar_migraciones(conn: sqlite3.Connection) -> int:
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción junto con
+    el cambio de user_version. Devuelve la versión final del esquema.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    # La vista HistorialTexto y los triggers FTS la necesitan, aunque la conexión no sea del pool.
+    registrar_funciones(conn)
+    if version_actual(conn) == 0:
+        # Base nueva (también desde una conexión que no es del pool): el modo solo se
+        # puede fijar antes de crear la primera tabla.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    for numero, migracion in enumerate(MIGRACIONES, start=1):
+        if numero <= version_actual(conn):
+            continue
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Otro proceso pudo haberla aplicado mientras esperábamos el bloqueo.
+            if numero > version_actual(conn):
+                migracion(conn)
+                conn.execute(f"PRAGMA user_version = {numero}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Migración {numero} ({migracion.__name__}) aplicada.")
+
+    return version_actual(conn)
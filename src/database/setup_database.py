@@ -1,71 +1,40 @@
+import os
 import sqlite3
+import sys
+
+if __package__ in (None, ""):
+    # Ejecutado como script (python database/setup_database.py): los imports parten de src.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from database.migrations import aplicar_migraciones
+
+# Datos de prueba
+USUARIOS_PRUEBA = [
+    ('juan@example.com', 'pass123', 'Juan Pérez', 'juanp'),
+    ('maria@example.com', '123456', 'María López', 'marial'),
+    ('carlos@example.com', 'abc123', 'Carlos Gómez', 'carlosg'),
+]
 
 def setup_database(conn: sqlite3.Connection):
     """
-    Configura la base de datos si no existe, creando las tablas necesarias.
+    Configura la base de datos si no existe, o actualiza una existente en el lugar,
+    aplicando las migraciones pendientes según PRAGMA user_version.
     Acepta una conexión SQLite existente como argumento.
     """
-    cursor = conn.cursor()
-
-    # Tabla de Usuarios
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS User (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        correo TEXT NOT NULL UNIQUE, -- Añadido UNIQUE para evitar correos duplicados
-        password TEXT NOT NULL,
-        nombre TEXT NOT NULL,
-        usuario TEXT NOT NULL UNIQUE -- Añadido UNIQUE para evitar usuarios duplicados
-    )
-    ''')
-    
-    # Tabla de Chats
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS Chat (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        titulo TEXT ,
-        FOREIGN KEY (user_id) REFERENCES User(id)
-    )
-    ''')
-
-    # Tabla de Historial
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS Historial (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        chat_id INTEGER NOT NULL,
-        orden INTEGER NOT NULL,
-        role TEXT NOT NULL,
-        contenido TEXT NOT NULL,
-        fecha TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (chat_id) REFERENCES Chat(id)
-    )
-    ''')
-
-    # Datos de prueba
-    users = [
-        ('juan@example.com', 'pass123', 'Juan Pérez', 'juanp'),
-        ('maria@example.com', '123456', 'María López', 'marial'),
-        ('carlos@example.com', 'abc123', 'Carlos Gómez', 'carlosg'),
-    ]
+    version = aplicar_migraciones(conn)
 
-    # Insertar usuarios de prueba solo si no existen
-    for correo, password, nombre, usuario in users:
-        cursor.execute("SELECT id FROM User WHERE correo = ? OR usuario = ?", (correo, usuario))
-        if cursor.fetchone() is None:
-            cursor.execute('''
-            INSERT INTO User (correo, password, nombre, usuario) 
-            VALUES (?, ?, ?, ?)
-            ''', (correo, password, nombre, usuario))
-            print(f"Usuario '{usuario}' insertado.")
-        else:
-            print(f"Usuario '{usuario}' o correo '{correo}' ya existe, omitiendo inserción.")
+    # Insertar usuarios de prueba solo si no existen (idempotente: ignora los
+    # correos o usuarios que ya están registrados)
+    with conn:
+        conn.executemany('''
+        INSERT OR IGNORE INTO User (correo, password, nombre, usuario)
+        VALUES (?, ?, ?, ?)
+        ''', USUARIOS_PRUEBA)
 
-    conn.commit()
-    print("Base de datos inicializada o verificada.")
+    print(f"Base de datos inicializada o verificada (esquema v{version}).")
 
 # Solo para ejecutar el archivo independiente
 if __name__ == "__main__":
     test_conn = sqlite3.connect('tesisIA.db')
     setup_database(test_conn)
-    test_conn.close() 
\ No newline at end of file
+    test_conn.close() 
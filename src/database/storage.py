@@ -0,0 +1,133 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from database.codec import registrar_funciones
+from database.setup_database import setup_database
+
+DB_PATH = "tesisIA.db"
+
+# Pragmas aplicados a cada conexión nueva del pool.
+PRAGMAS = (
+    # Solo tiene efecto en una base nueva, antes de crear la primera tabla; las bases
+    # existentes se convierten con archivo.convertir_auto_vacuum (archivar_chats.py).
+    "PRAGMA auto_vacuum = INCREMENTAL",
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",    # Seguro con WAL, evita un fsync por commit
+    "PRAGMA cache_size = -16000",     # ~16 MB de caché de páginas por conexión
+    "PRAGMA mmap_size = 134217728",   # 128 MB de lectura vía mmap
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class ConnectionPool:
+    """
+    Pool pequeño y thread-safe de conexiones SQLite persistentes.
+    Las conexiones se crean bajo demanda hasta `size` y se reutilizan, de modo que
+    los pragmas se aplican una sola vez y la caché de sentencias preparadas de cada
+    conexión (`cached_statements`) sobrevive entre llamadas.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, size: int = 4, cached_statements: int = 128):
+        self.db_path = db_path
+        self.size = size
+        self._cached_statements = cached_statements
+        self._libres: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue(maxsize=size)
+        self._creadas = 0
+        self._lock = threading.Lock()
+        self._cerrado = False
+
+    def _abrir(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=5,
+            check_same_thread=False,
+            cached_statements=self._cached_statements,
+        )
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        registrar_funciones(conn)
+        return conn
+
+    def adquirir(self) -> sqlite3.Connection:
+        """Toma una conexión libre, crea una nueva si hay cupo o espera a que se libere una."""
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            crear = self._creadas < self.size
+            if crear:
+                self._creadas += 1
+
+        if crear:
+            try:
+                return self._abrir()
+            except Exception:
+                with self._lock:
+                    self._creadas -= 1
+                raise
+        return self._libres.get()
+
+    def liberar(self, conn: sqlite3.Connection):
+        """Devuelve la conexión al pool descartando cualquier transacción a medias."""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._cerrado:
+            conn.close()
+            return
+        self._libres.put_nowait(conn)
+
+    @contextmanager
+    def conexion(self) -> Iterator[sqlite3.Connection]:
+        conn = self.adquirir()
+        try:
+            yield conn
+        finally:
+            self.liberar(conn)
+
+    @contextmanager
+    def transaccion(self) -> Iterator[sqlite3.Connection]:
+        """Conexión con commit al salir y rollback si ocurre una excepción."""
+        with self.conexion() as conn:
+            with conn:
+                yield conn
+
+    def cerrar(self):
+        self._cerrado = True
+        while True:
+            try:
+                self._libres.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_storage(db_path: str = DB_PATH, size: int = 4) -> ConnectionPool:
+    """
+    Crea el pool compartido y configura el esquema una sola vez por proceso.
+    Llamadas posteriores devuelven el mismo pool.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            pool = ConnectionPool(db_path, size)
+            with pool.conexion() as conn:
+                setup_database(conn)
+            _pool = pool
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    """Devuelve el pool compartido, inicializándolo si aún no existe."""
+    if _pool is None:
+        return init_storage()
+    return _pool
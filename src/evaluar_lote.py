@@ -0,0 +1,145 @@
+"""
+Evaluación por lote de borradores de tesis en PDF.
+
+Evalúa todos los PDF de un directorio con la misma rúbrica usando Gemini.evaluar_pdf
+(cada PDF queda como un chat del usuario indicado) y escribe un resultado por línea
+en JSONL o CSV, según la extensión del archivo de salida. El archivo de salida es
+también el punto de control: al relanzar el comando se omiten los PDF que ya tienen
+una evaluación exitosa, identificados por su SHA-256.
+
+Uso:
+    python evaluar_lote.py borradores/ --rubrica rubrica.txt --user-id 1 --salida resultados.jsonl
+"""
+import argparse
+import csv
+import json
+import pathlib
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, Set
+
+from database.storage import init_storage
+from backend.models.adjuntos import sha256_archivo
+from backend.models.gemini import Gemini
+
+CAMPOS = ["sha256", "archivo", "chat_id", "evaluacion", "tokens", "error", "segundos", "fecha"]
+
+
+def _completados(salida: pathlib.Path) -> Set[str]:
+    """SHA-256 de los PDF que ya tienen una evaluación sin error en la salida."""
+    if not salida.exists():
+        return set()
+    with open(salida, encoding="utf-8", newline="") as f:
+        if salida.suffix == ".csv":
+            filas: Iterator[Dict] = csv.DictReader(f)
+        else:
+            filas = (json.loads(linea) for linea in f if linea.strip())
+        return {fila["sha256"] for fila in filas if not fila.get("error")}
+
+
+class EscritorResultados:
+    """Agrega resultados al archivo de salida a medida que llegan, uno por línea."""
+
+    def __init__(self, salida: pathlib.Path):
+        self.csv = salida.suffix == ".csv"
+        nuevo = not salida.exists() or salida.stat().st_size == 0
+        self._archivo = open(salida, "a", encoding="utf-8", newline="")
+        self._lock = threading.Lock()
+        if self.csv:
+            self._writer = csv.DictWriter(self._archivo, fieldnames=CAMPOS)
+            if nuevo:
+                self._writer.writeheader()
+
+    def escribir(self, resultado: Dict):
+        with self._lock:
+            if self.csv:
+                self._writer.writerow(resultado)
+            else:
+                self._archivo.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            # Cada línea queda en disco antes de seguir: así sirve de punto de control.
+            self._archivo.flush()
+
+    def cerrar(self):
+        self._archivo.close()
+
+
+def evaluar(gemini: Gemini, pdf: pathlib.Path, sha256: str, rubrica: str, user_id: int) -> Dict:
+    inicio = time.monotonic()
+    resultado = {"sha256": sha256, "archivo": str(pdf), "chat_id": None,
+                 "evaluacion": None, "tokens": None, "error": None}
+    try:
+        respuesta = gemini.evaluar_pdf(pdf, rubrica, user_id=user_id)
+        resultado["chat_id"] = respuesta.chat_id
+        resultado["evaluacion"] = respuesta.texto
+        if respuesta.uso is not None:
+            resultado["tokens"] = respuesta.uso.total_token_count
+    except Exception as e:
+        resultado["error"] = f"{type(e).__name__}: {e}"
+    resultado["segundos"] = round(time.monotonic() - inicio, 2)
+    resultado["fecha"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    return resultado
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Evalúa un directorio de PDF con una rúbrica.")
+    parser.add_argument("directorio", type=pathlib.Path, help="Directorio con los PDF a evaluar")
+    parser.add_argument("--rubrica", required=True,
+                        help="Texto de la rúbrica, o ruta a un archivo que la contiene")
+    parser.add_argument("--user-id", type=int, required=True, help="Usuario dueño de los chats creados")
+    parser.add_argument("--salida", type=pathlib.Path, default=pathlib.Path("resultados.jsonl"),
+                        help="Archivo .jsonl o .csv de resultados (también es el punto de control)")
+    parser.add_argument("--workers", type=int, default=4, help="Evaluaciones simultáneas")
+    parser.add_argument("--recursivo", action="store_true", help="Buscar PDF también en subdirectorios")
+    args = parser.parse_args(argv)
+
+    if not args.directorio.is_dir():
+        parser.error(f"No es un directorio: {args.directorio}")
+    ruta_rubrica = pathlib.Path(args.rubrica)
+    rubrica = ruta_rubrica.read_text(encoding="utf-8") if ruta_rubrica.is_file() else args.rubrica
+
+    patron = "**/*.pdf" if args.recursivo else "*.pdf"
+    pdfs = sorted(p for p in args.directorio.glob(patron) if p.is_file())
+
+    hechos = _completados(args.salida)
+    pendientes = {}
+    for pdf in pdfs:
+        sha256 = sha256_archivo(pdf)
+        # Un mismo archivo con dos nombres se evalúa una sola vez.
+        if sha256 not in hechos and sha256 not in pendientes:
+            pendientes[sha256] = pdf
+    print(f"{len(pdfs)} PDF encontrados, {len(pendientes)} pendientes de evaluar.")
+    if not pendientes:
+        return 0
+
+    init_storage()
+    escritor = EscritorResultados(args.salida)
+    errores = 0
+    # Una sola instancia para todos los workers; el limitador de Gemini acota la
+    # cuota y la concurrencia real aunque haya más workers.
+    gemini = Gemini()
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        futuros = [pool.submit(evaluar, gemini, pdf, sha256, rubrica, args.user_id)
+                   for sha256, pdf in pendientes.items()]
+        for i, futuro in enumerate(as_completed(futuros), 1):
+            resultado = futuro.result()
+            escritor.escribir(resultado)
+            estado = "ERROR " + resultado["error"] if resultado["error"] else "ok"
+            print(f"[{i}/{len(futuros)}] {resultado['archivo']}: {estado}")
+            errores += bool(resultado["error"])
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        print("Interrumpido; los resultados escritos se conservan y se retomará desde ahí.")
+        return 130
+    finally:
+        pool.shutdown(wait=True)
+        escritor.cerrar()
+
+    print(f"Terminado: {len(pendientes) - errores} evaluados, {errores} con error.")
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
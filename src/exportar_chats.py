@@ -0,0 +1,59 @@
+"""
+Exportación e importación de los chats de un usuario.
+
+Exporta todos los chats del usuario (también los archivados) a JSONL, o a Markdown
+si la salida termina en .md, e importa un JSONL exportado como chats nuevos de otro
+usuario o de otra instancia. Ambos sentidos trabajan por lotes, con memoria
+constante sin importar cuántos chats tenga el usuario.
+
+Uso:
+    python exportar_chats.py exportar --user-id 1 --salida chats.jsonl
+    python exportar_chats.py exportar --user-id 1 --salida chats.md
+    python exportar_chats.py importar --user-id 2 --entrada chats.jsonl
+"""
+import argparse
+import pathlib
+import sys
+
+from dotenv import load_dotenv
+
+from database.exportacion import LOTE, a_markdown, escribir_jsonl, exportar_chats, importar_chats, leer_jsonl
+from database.storage import init_storage
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Exporta o importa los chats de un usuario.")
+    sub = parser.add_subparsers(dest="accion", required=True)
+
+    exportar = sub.add_parser("exportar", help="Escribe los chats del usuario en JSONL o Markdown")
+    exportar.add_argument("--user-id", type=int, required=True)
+    exportar.add_argument("--salida", type=pathlib.Path, required=True, help="Archivo .jsonl o .md")
+
+    importar = sub.add_parser("importar", help="Crea chats nuevos del usuario a partir de un JSONL")
+    importar.add_argument("--user-id", type=int, required=True)
+    importar.add_argument("--entrada", type=pathlib.Path, required=True)
+
+    parser.add_argument("--lote", type=int, default=LOTE, help="Filas por lote de lectura o escritura")
+    args = parser.parse_args(argv)
+
+    # Al importar, los mensajes se comprimen según TESISIA_CODEC y TESISIA_COMPRIMIR_DESDE.
+    load_dotenv()
+    pool = init_storage()
+    if args.accion == "exportar":
+        registros = exportar_chats(pool, args.user_id, args.lote)
+        with open(args.salida, "w", encoding="utf-8") as f:
+            if args.salida.suffix == ".md":
+                f.writelines(a_markdown(registros, f"Conversaciones del usuario {args.user_id}"))
+                print(f"Conversaciones exportadas a {args.salida}.")
+            else:
+                print(f"{escribir_jsonl(registros, f)} registros exportados a {args.salida}.")
+    else:
+        with open(args.entrada, encoding="utf-8") as f:
+            nuevos = importar_chats(pool, args.user_id, leer_jsonl(f), args.lote)
+        print(f"{len(nuevos)} chats importados para el usuario {args.user_id}.")
+    pool.cerrar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
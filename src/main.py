@@ -1,22 +1,13 @@
-import os
-import sqlite3
 import flet as ft
 from Frontend.Views.InitialView import InitialView
-from database.setup_database import setup_database
+from database.storage import init_storage
 
 
 def main(page: ft.Page):
-    db_path = 'tesisIA.db'
-    if not os.path.exists(db_path):
-        print("La base de datos no existe. Creándola...")
-        conn = sqlite3.connect(db_path)
-        setup_database(conn)
-        conn.close()
-    else:
-        print("BD ya creada.")
-
     page.clean()
     InitialView(page)
     page.update()
 
-ft.app(main)
\ No newline at end of file
+# El esquema se crea o verifica una sola vez al arrancar, no en cada consulta.
+init_storage()
+ft.app(main)
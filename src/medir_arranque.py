@@ -0,0 +1,74 @@
+"""
+Presupuesto de tiempo de importación del arranque.
+
+Importa en un intérprete limpio lo mismo que main.py antes de pintar la primera
+pantalla, con `python -X importtime`, y falla si tarda más del presupuesto o si se
+cargó algún módulo que debería importarse recién al llegar al chat (SDK de Gemini,
+dotenv).
+
+Uso:
+    python medir_arranque.py --presupuesto-ms 800
+"""
+import argparse
+import pathlib
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Lo que main.py importa antes de ft.app(main).
+MODULOS_ARRANQUE = ["flet", "Frontend.Views.InitialView", "database.storage"]
+
+# No deben cargarse al arrancar: se importan de forma diferida. httpx no está en la
+# lista porque flet mismo lo importa al arrancar.
+PROHIBIDOS = ["google.genai", "dotenv", "backend.models.gemini", "Frontend.Views.Chat"]
+
+
+def medir(modulos: List[str]) -> List[Tuple[str, int, int]]:
+    """(módulo, µs propios, µs acumulados) de cada import, según -X importtime."""
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modulos)],
+        cwd=pathlib.Path(__file__).parent,
+        capture_output=True,
+        text=True,
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr.strip().splitlines()[-1])
+
+    imports = []
+    for linea in resultado.stderr.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        propio, acumulado, nombre = linea[len("import time:"):].split("|")
+        # El nombre viene tras un espacio; la sangría extra indica imports anidados.
+        imports.append((nombre.rstrip()[1:], int(propio), int(acumulado)))
+    return imports
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Verifica el tiempo de importación del arranque.")
+    parser.add_argument("--presupuesto-ms", type=float, default=800,
+                        help="Tiempo máximo de importación permitido, en milisegundos")
+    parser.add_argument("--top", type=int, default=10, help="Cuántos imports más lentos mostrar")
+    args = parser.parse_args(argv)
+
+    imports = medir(MODULOS_ARRANQUE)
+    # Los imports de primer nivel no tienen sangría; su acumulado suma el total.
+    raiz: Dict[str, int] = {n.strip(): acum for n, _, acum in imports if not n.startswith(" ")}
+    total_ms = sum(raiz.values()) / 1000
+
+    print(f"Importación del arranque: {total_ms:.0f} ms (presupuesto {args.presupuesto_ms:.0f} ms)")
+    print("Más lentos (acumulado):")
+    for nombre, _, acumulado in sorted(imports, key=lambda i: i[2], reverse=True)[:args.top]:
+        print(f"  {acumulado / 1000:8.1f} ms  {nombre.strip()}")
+
+    cargados = {n.strip() for n, _, _ in imports}
+    indebidos = [m for m in PROHIBIDOS if m in cargados]
+    if indebidos:
+        print(f"ERROR: se importan al arrancar: {', '.join(indebidos)}")
+    if total_ms > args.presupuesto_ms:
+        print("ERROR: se excedió el presupuesto de importación.")
+    return 1 if indebidos or total_ms > args.presupuesto_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
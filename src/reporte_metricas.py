@@ -0,0 +1,60 @@
+"""
+Reporte de latencia y consumo de tokens.
+
+Muestra los percentiles p50/p95/p99 (ms) de cada etapa de las solicitudes al modelo
+(crear_chat, guardar_prompt, subir_pdf, cargar_historial, armar_contexto,
+cache_respuesta, modelo, primer_token, persistir y el total) y los tokens
+consumidos por usuario y por día, a partir de las tablas Metrica y MetricaEtapa.
+
+Uso:
+    python reporte_metricas.py --dias 7
+    python reporte_metricas.py --dias 30 --operacion stream
+    python reporte_metricas.py --purgar 90
+"""
+import argparse
+import sys
+
+from database.metricas import PERCENTILES, latencias, purgar, tokens_por_usuario
+from database.storage import init_storage
+
+
+def _ms(valor) -> str:
+    return "-" if valor is None else f"{valor:.1f}"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Percentiles de latencia por etapa y tokens por usuario y día.")
+    parser.add_argument("--dias", type=int, default=7, help="Días hacia atrás a considerar")
+    parser.add_argument("--operacion", choices=["respuesta", "stream", "pdf"], default=None)
+    parser.add_argument("--purgar", type=int, metavar="DIAS", default=None,
+                        help="Borra las métricas con más de DIAS días antes del reporte")
+    args = parser.parse_args(argv)
+
+    pool = init_storage()
+    if args.purgar is not None:
+        with pool.transaccion() as conn:
+            print(f"{purgar(conn, args.purgar)} solicitudes antiguas borradas.")
+
+    with pool.conexion() as conn:
+        etapas = latencias(conn, args.dias, args.operacion)
+        tokens = tokens_por_usuario(conn, args.dias)
+    pool.cerrar()
+
+    titulo = f" ({args.operacion})" if args.operacion else ""
+    print(f"\nLatencia por etapa en los últimos {args.dias} días{titulo}, en ms")
+    print(f"{'etapa':<18} {'n':>7}" + "".join(f" {'p' + str(p):>10}" for p in PERCENTILES))
+    for etapa, valores in etapas.items():
+        print(f"{etapa:<18} {valores['n']:>7}" + "".join(f" {_ms(valores[f'p{p}']):>10}" for p in PERCENTILES))
+
+    print("\nTokens por usuario y día")
+    print(f"{'día':<11} {'usuario':>8} {'solic.':>7} {'caché':>6} {'errores':>8} "
+          f"{'prompt':>10} {'respuesta':>10} {'en caché':>10}")
+    for fila in tokens:
+        print(f"{fila['dia']:<11} {str(fila['user_id']):>8} {fila['solicitudes']:>7} {fila['cacheadas']:>6} "
+              f"{fila['errores']:>8} {fila['tokens_prompt']:>10} {fila['tokens_respuesta']:>10} "
+              f"{fila['tokens_cache']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import sqlite3
+
+import pytest
+
+from database import escritura
+from database.escritura import EscritorHistorial
+from database.setup_database import setup_database
+from database.storage import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "prueba.db"), size=2)
+    with pool.conexion() as conn:
+        setup_database(conn)
+    with pool.transaccion() as conn:
+        conn.execute("INSERT INTO User (correo, password, nombre, usuario) VALUES ('a@b.c', 'x', 'Ana', 'ana')")
+        conn.execute("INSERT INTO Chat (user_id, titulo) VALUES (1, 'prueba')")
+    yield pool
+    pool.cerrar()
+
+
+@pytest.fixture
+def escritor(pool, monkeypatch):
+    monkeypatch.setattr(escritura.time, "sleep", lambda segundos: None)
+    escritor = EscritorHistorial(pool)
+    yield escritor
+    escritor.cerrar(timeout=2)
+
+
+def _mensajes(pool):
+    with pool.conexion() as conn:
+        return conn.execute("SELECT chat_id, orden, role FROM Historial ORDER BY orden").fetchall()
+
+
+def test_reintenta_si_la_base_esta_bloqueada(pool, escritor, monkeypatch):
+    transaccion = escritor._transaccion
+    fallas = [sqlite3.OperationalError("database is locked")] * 3
+
+    def bloqueada(lote):
+        if fallas:
+            raise fallas.pop()
+        return transaccion(lote)
+
+    monkeypatch.setattr(escritor, "_transaccion", bloqueada)
+    confirmados = []
+    escritor.encolar(1, "user", "hola", al_confirmar=lambda hid, orden: confirmados.append(orden))
+
+    assert escritor.flush(timeout=2)
+    assert confirmados == [1]
+    assert escritor.reintentos == 3
+    assert escritor.errores == 0
+    assert _mensajes(pool) == [(1, 1, "user")]
+
+
+def test_descarta_solo_el_mensaje_invalido(pool, escritor):
+    confirmados = []
+    escritor.encolar(1, "user", "hola", al_confirmar=lambda hid, orden: confirmados.append(orden))
+    escritor.encolar(99, "user", "chat inexistente", al_confirmar=lambda hid, orden: confirmados.append("99"))
+    escritor.encolar(1, "model", "respuesta", al_confirmar=lambda hid, orden: confirmados.append(orden))
+
+    assert escritor.flush(timeout=2) is False
+    assert escritor.errores == 1
+    assert confirmados == [1, 2]
+    assert _mensajes(pool) == [(1, 1, "user"), (1, 2, "model")]
+
+    # El error ya se informó: el siguiente flush sin fallas vuelve a dar True.
+    escritor.encolar(1, "user", "otra")
+    assert escritor.flush(timeout=2)
+
+
+def test_otros_errores_de_la_base_no_se_reintentan(escritor, monkeypatch):
+    def sin_tabla(lote):
+        raise sqlite3.OperationalError("no such table: Historial")
+
+    monkeypatch.setattr(escritor, "_transaccion", sin_tabla)
+    escritor.encolar(1, "user", "hola")
+    assert escritor.flush(timeout=2) is False
+    assert escritor.reintentos == 0
+
+
+def test_descarta_el_lote_si_la_base_sigue_bloqueada(pool, escritor, monkeypatch):
+    def bloqueada(lote):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(escritor, "_transaccion", bloqueada)
+    confirmados = []
+    escritor.encolar(1, "user", "hola", al_confirmar=lambda hid, orden: confirmados.append(orden))
+    escritor.encolar(1, "model", "respuesta", al_confirmar=lambda hid, orden: confirmados.append(orden))
+
+    assert escritor.flush(timeout=2) is False
+    # Uno o dos lotes, según cuándo los tomó el hilo: cada uno agotó sus reintentos.
+    assert escritor.reintentos in (escritor.max_reintentos, 2 * escritor.max_reintentos)
+    assert escritor.errores == 2
+    assert confirmados == []
+    assert escritor.pendientes() == 0
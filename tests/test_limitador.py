@@ -0,0 +1,169 @@
+import asyncio
+import gc
+
+import httpx
+import pytest
+from google.genai import errors
+
+from backend.models import limitador as modulo
+from backend.models.limitador import LimitadorGemini, TokenBucket
+
+
+def _error(codigo: int, retry_after=None, retry_delay=None) -> errors.APIError:
+    detalles = []
+    if retry_delay is not None:
+        detalles.append({"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay})
+    respuesta = None
+    if retry_after is not None:
+        respuesta = httpx.Response(codigo, headers={"retry-after": retry_after})
+    return errors.APIError(codigo, {"error": {"code": codigo, "message": "falla", "details": detalles}}, respuesta)
+
+
+class ClienteConFallas:
+    """Cliente falso que lanza los errores indicados, en orden, antes de responder."""
+
+    def __init__(self, *fallas, fallar_despues_de=None):
+        self.fallas = list(fallas)
+        self.fallar_despues_de = fallar_despues_de
+        self.llamadas = 0
+
+    def generar(self):
+        self.llamadas += 1
+        if self.fallas:
+            raise self.fallas.pop(0)
+        return "ok"
+
+    def stream(self):
+        self.llamadas += 1
+        if self.fallas:
+            raise self.fallas.pop(0)
+        return self._fragmentos()
+
+    def _fragmentos(self):
+        for i in range(3):
+            if self.fallar_despues_de is not None and i == self.fallar_despues_de:
+                raise _error(503)
+            yield i
+
+    async def generar_async(self):
+        return self.generar()
+
+    async def stream_async(self):
+        self.llamadas += 1
+        if self.fallas:
+            raise self.fallas.pop(0)
+
+        async def fragmentos():
+            for chunk in self._fragmentos():
+                yield chunk
+        return fragmentos()
+
+
+@pytest.fixture
+def esperas(monkeypatch):
+    """Registra las esperas en vez de dormir."""
+    registradas = []
+    dormir_async = asyncio.sleep
+
+    async def sleep_async(segundos):
+        registradas.append(segundos)
+        await dormir_async(0)
+
+    monkeypatch.setattr(modulo.time, "sleep", registradas.append)
+    monkeypatch.setattr(modulo.asyncio, "sleep", sleep_async)
+    return registradas
+
+
+@pytest.fixture
+def limitador():
+    return LimitadorGemini(rpm=60_000, tpm=10**9, max_reintentos=3, espera_base=0.01, espera_maxima=0.05)
+
+
+def _reintentos(esperas):
+    return [e for e in esperas if e > 0]
+
+
+def test_reintenta_429_y_503(limitador, esperas):
+    cliente = ClienteConFallas(_error(429), _error(503))
+    assert limitador.ejecutar(cliente.generar) == "ok"
+    assert cliente.llamadas == 3
+    assert limitador.metricas()["reintentos"] == 2
+    assert len(_reintentos(esperas)) == 2
+
+
+def test_no_reintenta_errores_del_cliente(limitador, esperas):
+    cliente = ClienteConFallas(_error(400))
+    with pytest.raises(errors.APIError):
+        limitador.ejecutar(cliente.generar)
+    assert cliente.llamadas == 1
+    assert limitador.metricas()["fallidas"] == 1
+
+
+def test_se_rinde_despues_de_max_reintentos(limitador, esperas):
+    cliente = ClienteConFallas(*[_error(503)] * 10)
+    with pytest.raises(errors.APIError):
+        limitador.ejecutar(cliente.generar)
+    assert cliente.llamadas == limitador.max_reintentos + 1
+
+
+def test_respeta_retry_after(limitador, esperas):
+    cliente = ClienteConFallas(_error(429, retry_after="7"))
+    limitador.ejecutar(cliente.generar)
+    assert _reintentos(esperas) == [7.0]
+
+
+def test_respeta_retry_info(limitador, esperas):
+    cliente = ClienteConFallas(_error(429, retry_delay="12s"))
+    limitador.ejecutar(cliente.generar)
+    assert _reintentos(esperas) == [12.0]
+
+
+def test_stream_reintenta_antes_del_primer_fragmento(limitador, esperas):
+    cliente = ClienteConFallas(_error(503))
+    assert list(limitador.stream(cliente.stream)) == [0, 1, 2]
+    assert cliente.llamadas == 2
+
+
+def test_stream_no_reintenta_despues_del_primer_fragmento(limitador, esperas):
+    cliente = ClienteConFallas(fallar_despues_de=1)
+    recibidos = []
+    with pytest.raises(errors.APIError):
+        for chunk in limitador.stream(cliente.stream):
+            recibidos.append(chunk)
+    assert recibidos == [0]
+    assert cliente.llamadas == 1
+    assert limitador.metricas()["reintentos"] == 0
+
+
+def test_async_reintenta_y_respeta_retry_after(limitador, esperas):
+    cliente = ClienteConFallas(_error(429, retry_after="3"), _error(500))
+    assert asyncio.run(limitador.ejecutar_async(cliente.generar_async)) == "ok"
+    assert cliente.llamadas == 3
+    assert _reintentos(esperas)[0] == 3.0
+
+
+def test_stream_async_solo_reintenta_antes_del_primer_fragmento(limitador, esperas):
+    async def leer(cliente):
+        return [chunk async for chunk in limitador.stream_async(cliente.stream_async)]
+
+    cliente = ClienteConFallas(_error(503))
+    assert asyncio.run(leer(cliente)) == [0, 1, 2]
+    assert cliente.llamadas == 2
+
+    cliente = ClienteConFallas(fallar_despues_de=1)
+    with pytest.raises(errors.APIError):
+        asyncio.run(leer(cliente))
+    assert cliente.llamadas == 1
+
+
+def test_no_retiene_bucles_de_eventos(limitador, esperas):
+    asyncio.run(limitador.ejecutar_async(ClienteConFallas().generar_async))
+    gc.collect()
+    assert len(limitador._semaforos_async) == 0
+
+
+def test_token_bucket_indica_la_espera():
+    cubeta = TokenBucket(capacidad=2, por_segundo=1)
+    assert cubeta.reservar() == 0
+    assert cubeta.reservar() == 0
+    assert cubeta.reservar() == pytest.approx(1, abs=0.05)
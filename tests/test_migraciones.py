@@ -0,0 +1,64 @@
+import sqlite3
+
+from database.archivo import convertir_auto_vacuum, vacuum_incremental
+from database.codec import ZLIB, comprimir
+from database.migrations import MIGRACIONES
+from database.setup_database import setup_database
+from database.storage import ConnectionPool
+
+
+def test_setup_database_con_una_conexion_cualquiera(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "prueba.db"))
+    setup_database(conn)
+    with conn:
+        conn.execute("INSERT INTO Chat (user_id, titulo) VALUES (1, 'prueba')")
+        valor, codec = comprimir("hola mundo " * 200, ZLIB, umbral=0)
+        conn.execute("INSERT INTO Historial (chat_id, orden, role, contenido, codec) VALUES (1, 1, 'user', ?, ?)",
+                     (valor, codec))
+
+    # El índice FTS guarda el texto descomprimido, no los bytes.
+    assert conn.execute("SELECT rowid FROM HistorialFTS WHERE HistorialFTS MATCH 'mundo'").fetchall() == [(1,)]
+    conn.close()
+
+
+def test_bases_nuevas_en_auto_vacuum_incremental(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "nueva.db"))
+    with pool.conexion() as conn:
+        setup_database(conn)
+        assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    assert vacuum_incremental(pool)
+    pool.cerrar()
+
+
+def test_bases_viejas_se_convierten_solo_a_pedido(tmp_path):
+    ruta = str(tmp_path / "vieja.db")
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE Previa (a)")
+    conn.close()
+
+    pool = ConnectionPool(ruta)
+    with pool.conexion() as conn:
+        setup_database(conn)
+    # El archivado no hace un VACUUM completo por su cuenta.
+    assert not vacuum_incremental(pool)
+    assert convertir_auto_vacuum(pool)
+    assert vacuum_incremental(pool)
+    assert not convertir_auto_vacuum(pool)
+    pool.cerrar()
+
+
+def test_migracion_2_renumera_orden_duplicado(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "v1.db"))
+    MIGRACIONES[0](conn)
+    conn.execute("PRAGMA user_version = 1")
+    conn.execute("INSERT INTO User (correo, password, nombre, usuario) VALUES ('a@b.c', 'x', 'Ana', 'ana')")
+    conn.execute("INSERT INTO Chat (user_id, titulo) VALUES (1, 'prueba')")
+    conn.executemany("INSERT INTO Historial (chat_id, orden, role, contenido) VALUES (1, ?, 'user', ?)",
+                     [(orden, f"m{i}") for i, orden in enumerate((1, 2, 2, 3, 3, 4))])
+    conn.commit()
+
+    setup_database(conn)
+    filas = conn.execute("SELECT orden, contenido FROM Historial ORDER BY orden").fetchall()
+    assert filas == [(i + 1, f"m{i}") for i in range(6)]
+    assert conn.execute("SELECT ultimo_orden FROM Chat WHERE id = 1").fetchone()[0] == 6
+    conn.close()
@@ -0,0 +1,161 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors
+
+from backend.models import prompt_cache
+from backend.models.prompt_cache import CachePrompt
+
+TTL = 100
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+
+class CachesFalsas:
+    def __init__(self):
+        self.creadas = 0
+        self.actualizadas = []
+        self.fallar_create = False
+        self.fallar_update = False
+        self.durante_update = None
+
+    def create(self, model, config):
+        if self.fallar_create:
+            raise errors.APIError(400, {"error": {"code": 400, "message": "muy corto"}})
+        self.creadas += 1
+        return SimpleNamespace(name=f"cachedContents/{self.creadas}")
+
+    def update(self, name, config):
+        if self.durante_update:
+            self.durante_update()
+        if self.fallar_update:
+            raise errors.APIError(404, {"error": {"code": 404, "message": "no existe"}})
+        self.actualizadas.append(name)
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(prompt_cache, "time", reloj)
+    return reloj
+
+
+@pytest.fixture
+def caches():
+    return CachesFalsas()
+
+
+@pytest.fixture
+def cache(caches, reloj):
+    return CachePrompt(SimpleNamespace(caches=caches), "modelo", "instrucciones",
+                       ttl_segundos=TTL, tokens_minimos=0)
+
+
+def test_crea_una_vez_y_reutiliza(cache, caches):
+    assert cache.config().cached_content == "cachedContents/1"
+    assert cache.obtener() == "cachedContents/1"
+    assert caches.creadas == 1
+    assert caches.actualizadas == []
+
+
+def test_refresca_pasada_la_mitad_del_ttl(cache, caches, reloj):
+    cache.obtener()
+    reloj.ahora += TTL * 0.6
+    assert cache.obtener() == "cachedContents/1"
+    assert caches.actualizadas == ["cachedContents/1"]
+
+    # El TTL se extendió desde el refresco: sigue vigente más allá del vencimiento original.
+    reloj.ahora += TTL * 0.45
+    assert cache.obtener() == "cachedContents/1"
+    assert caches.creadas == 1
+
+
+def test_recrea_si_el_refresco_falla(cache, caches, reloj):
+    cache.obtener()
+    caches.fallar_update = True
+    reloj.ahora += TTL * 0.6
+    assert cache.obtener() == "cachedContents/2"
+    assert caches.creadas == 2
+
+
+def test_recrea_si_expiro(cache, caches, reloj):
+    cache.obtener()
+    reloj.ahora += TTL + 1
+    assert cache.obtener() == "cachedContents/2"
+    assert caches.actualizadas == []
+
+
+def test_invalidar_fuerza_una_caché_nueva(cache, caches):
+    cache.obtener()
+    cache.invalidar()
+    assert cache.obtener() == "cachedContents/2"
+
+
+def test_si_la_creacion_falla_envia_inline_y_no_reintenta_enseguida(cache, caches, reloj):
+    caches.fallar_create = True
+    config = cache.config()
+    assert config.cached_content is None
+    assert config.system_instruction == "instrucciones"
+
+    caches.fallar_create = False
+    reloj.ahora += TTL / 2
+    assert cache.obtener() is None
+    reloj.ahora += TTL
+    assert cache.obtener() == "cachedContents/1"
+
+
+def test_prompt_corto_no_usa_la_caché(caches, reloj):
+    cache = CachePrompt(SimpleNamespace(caches=caches), "modelo", "corto",
+                        ttl_segundos=TTL, tokens_minimos=1024)
+    assert cache.config().system_instruction == "corto"
+    assert caches.creadas == 0
+
+
+def test_el_refresco_no_bloquea_a_otros_hilos(cache, caches, reloj):
+    cache.obtener()
+    reloj.ahora += TTL * 0.6
+    vistos = []
+
+    def otro_hilo():
+        hilo = threading.Thread(target=lambda: vistos.append(cache.obtener()))
+        hilo.start()
+        hilo.join(timeout=2)
+        assert not hilo.is_alive(), "obtener() esperó al refresco en curso"
+
+    caches.durante_update = otro_hilo
+    cache.obtener()
+    assert vistos == ["cachedContents/1"]
+    assert len(caches.actualizadas) == 1
+
+
+def test_el_minimo_depende_del_modelo(caches, reloj):
+    cache = CachePrompt(SimpleNamespace(caches=caches), "gemini-2.0-flash", "x" * 4000)
+    assert cache.tokens_minimos == prompt_cache.TOKENS_MINIMOS["gemini-2.0-flash"]
+    assert cache.obtener() is None
+    assert caches.creadas == 0
+
+
+def test_detecta_la_caché_vencida_en_el_servidor(cache):
+    vencida = errors.APIError(403, {"error": {"code": 403, "message": "CachedContent not found (or permission denied)"}})
+    otro = errors.APIError(400, {"error": {"code": 400, "message": "Request contains an invalid argument."}})
+
+    assert CachePrompt.es_cache_vencida(cache.config(), vencida)
+    assert not CachePrompt.es_cache_vencida(cache.config(), otro)
+    assert not CachePrompt.es_cache_vencida(cache.config_inline(), vencida)
+
+
+def test_invalidar_con_nombre_no_borra_una_caché_ya_recreada(cache, caches):
+    vieja = cache.obtener()
+    cache.invalidar(vieja)
+    nueva = cache.obtener()
+    assert nueva == "cachedContents/2"
+
+    cache.invalidar(vieja)
+    assert cache.obtener() == nueva
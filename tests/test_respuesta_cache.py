@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from backend.models import respuesta_cache
+from backend.models.respuesta_cache import RespuestaCache
+from database.setup_database import setup_database
+from database.storage import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path, monkeypatch):
+    pool = ConnectionPool(str(tmp_path / "prueba.db"), size=2)
+    with pool.conexion() as conn:
+        setup_database(conn)
+    monkeypatch.setattr(respuesta_cache, "get_pool", lambda: pool)
+    yield pool
+    pool.cerrar()
+
+
+def _persistidas(pool):
+    with pool.conexion() as conn:
+        return conn.execute("SELECT clave, respuesta FROM RespuestaCache ORDER BY clave").fetchall()
+
+
+def test_guardar_no_escribe_en_el_hilo_que_responde(pool, monkeypatch):
+    cache = RespuestaCache()
+    hilos = []
+    escribir = cache._escribir
+    monkeypatch.setattr(cache, "_escribir", lambda lote: (hilos.append(threading.current_thread()), escribir(lote)))
+
+    cache.guardar("a", "respuesta a")
+    cache.guardar("b", "respuesta b")
+    assert cache.obtener("a") == "respuesta a"
+    cache.cerrar(timeout=2)
+
+    assert threading.current_thread() not in hilos
+    assert _persistidas(pool) == [("a", "respuesta a"), ("b", "respuesta b")]
+    assert cache._escrituras == 2
+
+
+def test_sobrevive_a_un_reinicio(pool):
+    cache = RespuestaCache()
+    cache.guardar("a", "respuesta a")
+    cache.cerrar(timeout=2)
+
+    assert RespuestaCache().obtener("a") == "respuesta a"
+
+
+def test_poda_las_mas_antiguas(pool):
+    cache = RespuestaCache(max_persistidas=10)
+    for i in range(100):
+        cache.guardar(f"{i:03}", "respuesta", creado=1e12 + i)
+    cache.cerrar(timeout=2)
+
+    assert [clave for clave, _ in _persistidas(pool)] == [f"{i:03}" for i in range(90, 100)]
@@ -0,0 +1,170 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.models.single_flight import SingleFlight
+
+
+def test_hacer_agrupa_llamadas_simultaneas():
+    sf = SingleFlight()
+    llamadas = []
+    liberar = threading.Event()
+
+    def funcion():
+        llamadas.append(1)
+        liberar.wait(2)
+        return "respuesta"
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(sf.hacer("k", funcion))) for _ in range(3)]
+    for h in hilos:
+        h.start()
+    time.sleep(0.1)
+    liberar.set()
+    for h in hilos:
+        h.join(2)
+
+    assert resultados == ["respuesta"] * 3
+    assert len(llamadas) == 1
+    assert sf.agrupadas == 2
+
+
+def test_hacer_propaga_el_error_a_todos():
+    sf = SingleFlight()
+
+    def funcion():
+        time.sleep(0.1)
+        raise ValueError("falló")
+
+    errores = []
+
+    def pedir():
+        try:
+            sf.hacer("k", funcion)
+        except ValueError as e:
+            errores.append(str(e))
+
+    hilos = [threading.Thread(target=pedir) for _ in range(2)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join(2)
+    assert errores == ["falló", "falló"]
+
+
+def test_stream_sigue_para_los_demas_si_el_lider_lo_abandona():
+    sf = SingleFlight()
+    paso = threading.Semaphore(0)
+
+    def fragmentos():
+        for i in range(5):
+            paso.acquire(timeout=2)
+            yield i
+
+    lider = sf.stream("k", fragmentos)
+    paso.release()
+    assert next(lider) == 0
+
+    seguidor = sf.stream("k", fragmentos)
+    recibidos = []
+    hilo = threading.Thread(target=lambda: recibidos.extend(seguidor))
+    hilo.start()
+
+    lider.close()
+    for _ in range(4):
+        paso.release()
+    hilo.join(2)
+    assert recibidos == [0, 1, 2, 3, 4]
+
+
+def test_stream_se_detiene_si_nadie_lo_lee():
+    sf = SingleFlight()
+    pedidos = []
+    cerrado = threading.Event()
+
+    def fragmentos():
+        try:
+            for i in range(100):
+                pedidos.append(i)
+                time.sleep(0.01)
+                yield i
+        finally:
+            cerrado.set()
+
+    lector = sf.stream("k", fragmentos)
+    next(lector)
+    lector.close()
+    assert cerrado.wait(2)
+    assert len(pedidos) < 100
+
+
+def test_hacer_async_cancelar_al_lider_no_afecta_al_seguidor():
+    async def escenario():
+        sf = SingleFlight()
+        llamadas = []
+
+        async def funcion():
+            llamadas.append(1)
+            await asyncio.sleep(0.05)
+            return "respuesta"
+
+        lider = asyncio.ensure_future(sf.hacer_async("k", funcion))
+        await asyncio.sleep(0)
+        seguidor = asyncio.ensure_future(sf.hacer_async("k", funcion))
+        await asyncio.sleep(0)
+        lider.cancel()
+
+        assert await seguidor == "respuesta"
+        with pytest.raises(asyncio.CancelledError):
+            await lider
+        assert len(llamadas) == 1
+
+    asyncio.run(escenario())
+
+
+def test_hacer_async_cancela_la_llamada_si_nadie_espera():
+    async def escenario():
+        sf = SingleFlight()
+        terminada = []
+
+        async def funcion():
+            await asyncio.sleep(1)
+            terminada.append(1)
+
+        tarea = asyncio.ensure_future(sf.hacer_async("k", funcion))
+        await asyncio.sleep(0)
+        tarea.cancel()
+        await asyncio.sleep(0.05)
+        assert sf._vuelos_async == {}
+        assert terminada == []
+
+    asyncio.run(escenario())
+
+
+def test_stream_async_sigue_para_los_demas_si_el_lider_lo_abandona():
+    async def escenario():
+        sf = SingleFlight()
+
+        async def funcion():
+            async def fragmentos():
+                for i in range(5):
+                    await asyncio.sleep(0.01)
+                    yield i
+            return fragmentos()
+
+        lider = sf.stream_async("k", funcion)
+        assert await lider.__anext__() == 0
+        seguidor = sf.stream_async("k", funcion)
+        tarea = asyncio.ensure_future(_todos(seguidor))
+        await asyncio.sleep(0)
+        await lider.aclose()
+
+        assert await tarea == [0, 1, 2, 3, 4]
+
+    asyncio.run(escenario())
+
+
+async def _todos(iterador):
+    return [x async for x in iterador]